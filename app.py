@@ -1,17 +1,21 @@
 import streamlit as st
 from ui_helpers import inject_fintech_styles, render_header, render_footer
 from backend.auth import register_user, login_user
-from backend.chatbot import generate_chat_response, search_all_categories, llm
-from backend.analytics import display_analytics, _format_asset_type
-from backend.data_manager import show_data_dashboard
+# backend.chatbot, backend.analytics and backend.data_manager are imported where
+# they are used, so the login page renders without loading the model stack
 from dotenv import load_dotenv
 from streamlit_sortables import sort_items
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 load_dotenv()
 st.set_page_config(page_title="FinPilot", page_icon="📊", layout="wide")
 
+MAX_CONCURRENT_ANALYSES = 8  # per-strategy LLM calls in flight at once
+# Users who see the Admin page (LLM metrics), comma separated
+ADMIN_EMAILS = {e.strip() for e in os.getenv("FINPILOT_ADMIN_EMAILS", "").split(",") if e.strip()}
+
 # ───── Session ─────
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -81,9 +85,12 @@ def render_navigation():
         </style>
     """, unsafe_allow_html=True)
     st.markdown('<div class="nav-container">', unsafe_allow_html=True)
-    cols = st.columns([1, 1, 1])
     tab_icons = ["💡", "📈", "📊"]
     tab_names = ["Recommendations", "Analytics", "Data"]
+    if st.session_state.current_user_email in ADMIN_EMAILS:
+        tab_icons.append("🛠️")
+        tab_names.append("Admin")
+    cols = st.columns([1] * len(tab_names))
     for i, (icon, name) in enumerate(zip(tab_icons, tab_names)):
         with cols[i]:
             if st.button(f"{icon} {name}", use_container_width=True):
@@ -92,6 +99,10 @@ def render_navigation():
 
 # ───── Recommendations ─────
 def recommendation_ui():
+    from backend.analytics import _format_asset_type
+    from backend.chatbot import search_all_categories
+    from backend import llm_cache
+
     st.subheader("💡 AI-Powered Investment Strategies")
     col1, col2 = st.columns(2)
     with col1:
@@ -170,12 +181,35 @@ def recommendation_ui():
                     total_score = (priority_score * 0.7) + (profile_match * 0.3)
                     scored_items.append((item, total_score))
                 scored_items.sort(key=lambda x: x[1], reverse=True)
+                # One placeholder per card, in score order, filled as each analysis arrives
+                placeholders = []
                 for item, score in scored_items:
-                    name = item.get("name", "Unnamed Strategy")
-                    strategy_risk = item.get("risk_profile", "Not specified")
-                    strategy_horizon = item.get("time_horizon", "Not specified")
-                    target_return = item.get("target_annual_return", 0)
-                    strategy_prompt = f"""Analyze this investment strategy for a user with the following preferences:
+                    placeholders.append(st.empty())
+                    placeholders[-1].markdown(_strategy_card(item, risk_profile, time_horizon, "<em>Analyzing…</em>"),
+                                              unsafe_allow_html=True)
+                # LLM calls run concurrently; only this (the script) thread touches Streamlit
+                with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_ANALYSES, len(scored_items))) as pool:
+                    futures = {
+                        pool.submit(llm_cache.cached_invoke, [{"role": "user", "content": _strategy_prompt(
+                            item, risk_profile, time_horizon, query)}], site="strategy_analysis"): i
+                        for i, (item, score) in enumerate(scored_items)
+                    }
+                    for future in as_completed(futures):
+                        i = futures[future]
+                        item = scored_items[i][0]
+                        try:
+                            strategy_analysis = future.result()
+                        except Exception as e:
+                            strategy_analysis = f"""
+                            This strategy appears suitable for {risk_profile.lower()} risk investors with a {time_horizon.lower()} time horizon.
+                            Key benefits include potential returns of {item.get("target_annual_return", 0)}% and a diversified allocation across multiple asset classes.
+                            Consider your specific financial goals and risk tolerance when evaluating this strategy.
+                            """
+                        placeholders[i].markdown(_strategy_card(item, risk_profile, time_horizon, strategy_analysis),
+                                                 unsafe_allow_html=True)
+
+def _strategy_prompt(item, risk_profile, time_horizon, query):
+    return f"""Analyze this investment strategy for a user with the following preferences:
                     User Risk Profile: {risk_profile}
                     User Time Horizon: {time_horizon}
                     User Goals: {query}
@@ -186,21 +220,19 @@ def recommendation_ui():
                     2. Key benefits and potential risks
                     3. Specific considerations for this user
                     Keep the response concise and actionable."""
-                    try:
-                        strategy_analysis = llm.invoke([{"role": "user", "content": strategy_prompt}]).content
-                    except Exception as e:
-                        strategy_analysis = f"""
-                        This strategy appears suitable for {risk_profile.lower()} risk investors with a {time_horizon.lower()} time horizon.
-                        Key benefits include potential returns of {target_return}% and a diversified allocation across multiple asset classes.
-                        Consider your specific financial goals and risk tolerance when evaluating this strategy.
-                        """
-                    risk_match = 1 if risk_profile.lower() in strategy_risk.lower() else 0.5
-                    horizon_match = 1 if time_horizon.split()[0].lower() in strategy_horizon.lower() else 0.5
-                    match_pct = int(((risk_match + horizon_match) / 2) * 100)
-                    priority = "high" if match_pct > 80 else "medium" if match_pct > 50 else "low"
-                    allocation = item.get("allocation_blueprint", {})
-                    allocation_desc = ", ".join([f"{k}: {v}%" for k, v in allocation.items()])
-                    st.markdown(f"""
+
+def _strategy_card(item, risk_profile, time_horizon, strategy_analysis):
+    name = item.get("name", "Unnamed Strategy")
+    strategy_risk = item.get("risk_profile", "Not specified")
+    strategy_horizon = item.get("time_horizon", "Not specified")
+    target_return = item.get("target_annual_return", 0)
+    risk_match = 1 if risk_profile.lower() in strategy_risk.lower() else 0.5
+    horizon_match = 1 if time_horizon.split()[0].lower() in strategy_horizon.lower() else 0.5
+    match_pct = int(((risk_match + horizon_match) / 2) * 100)
+    priority = "high" if match_pct > 80 else "medium" if match_pct > 50 else "low"
+    allocation = item.get("allocation_blueprint", {})
+    allocation_desc = ", ".join([f"{k}: {v}%" for k, v in allocation.items()])
+    return f"""
                     <div class='rec-card' style='width: 100%; margin-bottom: 15px; padding: 15px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);'>
                         <div style='display:flex;justify-content:space-between;align-items:center;margin-bottom:8px;'>
                             <h3 style='margin: 0; font-size: 1.3em; color: black;'>{name}</h3>
@@ -217,7 +249,36 @@ def recommendation_ui():
                         <p class='desc' style='font-size: 0.9em; margin: 8px 0; color: black;'>{strategy_analysis}</p>
                         <div style='font-size: 0.9em; color: ;'><strong>Allocation:</strong> {allocation_desc}</div>
                     </div>
-                    """, unsafe_allow_html=True)
+                    """
+
+# ───── Admin ─────
+def admin_ui():
+    from backend import llm_cache, llm_metrics
+    from backend.chatbot import embedding_cache_stats
+
+    st.subheader("🛠️ LLM Call Metrics")
+    st.caption("Per call site, for this app process. Latencies are LLM round-trips; cache hits are counted separately.")
+    rows = llm_metrics.registry.snapshot()
+    if rows:
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.info("No LLM calls recorded in this process yet.")
+
+    response_cache = llm_cache.cache_stats()
+    query_cache = embedding_cache_stats()
+    col1, col2 = st.columns(2)
+    col1.metric("Response cache hits / misses", f"{response_cache['hits']} / {response_cache['misses']}")
+    col2.metric("Query embedding cache hits / misses", f"{query_cache['hits']} / {query_cache['misses']}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("⬇️ Prometheus metrics", llm_metrics.registry.prometheus_text(),
+                           file_name="finpilot_llm_metrics.prom", mime="text/plain")
+    with col2:
+        if llm_metrics.LOG_PATH and os.path.exists(llm_metrics.LOG_PATH):
+            with open(llm_metrics.LOG_PATH, "r", encoding="utf-8") as f:
+                st.download_button("⬇️ Call log (JSONL)", f.read(), file_name="llm_calls.jsonl",
+                                   mime="application/jsonl")
 
 # ───── Main UI ─────
 def main_ui():
@@ -237,18 +298,32 @@ def main_ui():
     if st.session_state.page == "Recommendations":
         recommendation_ui()
     elif st.session_state.page == "Analytics":
+        from backend.analytics import display_analytics
         display_analytics()
     elif st.session_state.page == "Data":
+        from backend.data_manager import show_data_dashboard
         show_data_dashboard()
+    elif st.session_state.page == "Admin" and st.session_state.current_user_email in ADMIN_EMAILS:
+        admin_ui()
 
 # ───── Chat Handler ─────
 def send_message(msg: str):
+    from backend.chatbot import format_reply, stream_chat_response
+
     st.session_state.chat_history.append(("user", msg))
-    with st.spinner("FinPilot is thinking..."):
-        try:
-            reply = generate_chat_response(msg)
-        except Exception as e:
-            reply = f"⚠️ Error: {e}"
+    st.markdown(f"**🧑 You:** {msg}")
+    # Tokens are drawn into one placeholder as they arrive; the full text goes to history
+    placeholder = st.empty()
+    placeholder.markdown("**🤖 FinPilot:** _thinking…_")
+    reply = ""
+    try:
+        for chunk in stream_chat_response(msg):
+            reply += chunk
+            placeholder.markdown(f"**🤖 FinPilot:** {reply}▌")
+        reply = format_reply(reply)
+    except Exception as e:
+        reply = f"⚠️ Error: {e}"
+    placeholder.markdown(f"**🤖 FinPilot:** {reply}")
     st.session_state.chat_history.append(("bot", reply))
 
 # ───── Run ─────
@@ -0,0 +1,242 @@
+# backend/aggregates.py
+#
+# Materialized per-user aggregates for the Analytics page: transaction counts
+# and sums per category, merchant, currency, payment method and month (plus
+# a histogram of the amounts, for percentiles), asset stats per type and
+# country, and a fingerprint of the records that versions the LLM cache.
+# They are built from the user's records once, then kept current by the
+# writers in backend/data_manager.py, which fold in each changed record
+# (subtract the old version, add the new one) instead of rescanning.
+#
+# Like dataset_cache views, an aggregates dict is an immutable snapshot:
+# an update publishes a new one (sharing the tables it did not touch), so
+# readers never see a half-applied change. Entries are tied to the storage
+# they were built from and are rebuilt when it is replaced (e.g. by a
+# compaction) or changed by a writer other than this process's savers.
+
+import hashlib
+import json
+import math
+import threading
+from . import change_log
+
+_store = {}  # (store_key, user_id) -> (source, aggregates, log position)
+_lock = threading.Lock()
+_stats = {"hits": 0, "builds": 0, "updates": 0}
+
+# Amounts are kept as a histogram of their value to AMOUNT_DIGITS significant
+# digits, so percentiles cost O(buckets) and an update never copies every amount
+AMOUNT_DIGITS = 3
+
+_FINGERPRINT_MOD = 2 ** 64
+
+def empty():
+    return {
+        "fingerprint": 0,        # sum of the record hashes mod 2**64 (see data_version)
+        "transactions": 0,
+        "total_spend": 0.0,
+        "amount_histogram": {},  # amount to AMOUNT_DIGITS significant digits -> count
+        "categories": {},        # category (None when missing) -> [count, total]
+        "merchants": {},         # merchant -> [count, total]
+        "currencies": {},        # currency -> [count, total]
+        "months": {},            # "YYYY-MM" -> [count, total]
+        "payment_methods": {},   # payment method -> count
+        "assets": 0,
+        "asset_types": {},       # type -> {"count", "return_sum", "countries": {country: count}}
+        "countries": {}          # country -> {"count", "return_sum", "value_sum"}
+    }
+
+class _Snapshot:
+    """The aggregates an update builds: each table is copied the first time it is touched.
+
+    Tables the changes leave alone are shared with the previous snapshot, so
+    an update costs O(changes) plus the size of the tables it touches, which
+    is bounded by their number of keys rather than by the user's history.
+    Folds never modify a table value in place; they replace it.
+    """
+
+    def __init__(self, aggs, fresh=False):
+        self.aggs = aggs if fresh else dict(aggs)
+        self._copied = None if fresh else set()
+
+    def table(self, key):
+        if self._copied is not None and key not in self._copied:
+            self.aggs[key] = dict(self.aggs[key])
+            self._copied.add(key)
+        return self.aggs[key]
+
+# ─── Folding records in and out ───
+def _number(value):
+    return float(value or 0)
+
+def amount_bucket(amount):
+    return float(f"{amount:.{AMOUNT_DIGITS}g}")
+
+def _bump_count(table, key, sign):
+    count = table.get(key, 0) + sign
+    if count:
+        table[key] = count
+    else:
+        table.pop(key, None)
+
+def _bump_sum(table, key, sign, amount):
+    count, total = table.get(key, (0, 0.0))
+    if count + sign:
+        table[key] = [count + sign, total + sign * amount]
+    else:
+        # Dropping emptied keys also drops the rounding error accumulated in them
+        table.pop(key, None)
+
+def _fold_transaction(snapshot, t, sign):
+    aggs = snapshot.aggs
+    amount = _number(t.get("amount", 0))
+    aggs["transactions"] += sign
+    aggs["total_spend"] = aggs["total_spend"] + sign * amount if aggs["transactions"] else 0.0
+    _bump_count(snapshot.table("amount_histogram"), amount_bucket(amount), sign)
+    _bump_sum(snapshot.table("categories"), t.get("category"), sign, amount)
+    _bump_sum(snapshot.table("merchants"), t.get("merchant_name", "unknown"), sign, amount)
+    _bump_sum(snapshot.table("currencies"), t.get("currency", "Unknown"), sign, amount)
+    if t.get("timestamp"):
+        _bump_sum(snapshot.table("months"), t["timestamp"][:7], sign, amount)
+    _bump_count(snapshot.table("payment_methods"), t.get("payment_method", "unknown"), sign)
+
+def _fold_asset(snapshot, a, sign):
+    expected_return = _number(a.get("expected_return", 0))
+    country_name = a.get("country")
+    snapshot.aggs["assets"] += sign
+
+    asset_types = snapshot.table("asset_types")
+    old = asset_types.get(a.get("type"), {"count": 0, "return_sum": 0.0, "countries": {}})
+    asset_type = {"count": old["count"] + sign, "return_sum": old["return_sum"] + sign * expected_return,
+                  "countries": dict(old["countries"])}
+    _bump_count(asset_type["countries"], "N/A" if country_name is None else country_name, sign)
+    if asset_type["count"]:
+        asset_types[a.get("type")] = asset_type
+    else:
+        asset_types.pop(a.get("type"), None)
+
+    countries = snapshot.table("countries")
+    country_key = "Unknown" if country_name is None else country_name
+    old = countries.get(country_key, {"count": 0, "return_sum": 0.0, "value_sum": 0.0})
+    country = {"count": old["count"] + sign, "return_sum": old["return_sum"] + sign * expected_return,
+               "value_sum": old["value_sum"] + sign * _number(a.get("minimum_investment_amount", 0))}
+    if country["count"]:
+        countries[country_key] = country
+    else:
+        countries.pop(country_key, None)
+
+_FOLDERS = {"transactions": _fold_transaction, "financial_assets": _fold_asset}
+
+def _record_hash(section, record):
+    canonical = json.dumps([section, record], sort_keys=True, default=str, separators=(",", ":"))
+    return int.from_bytes(hashlib.sha256(canonical.encode("utf-8")).digest()[:8], "big")
+
+def _fold(snapshot, section, record, sign):
+    _FOLDERS[section](snapshot, record, sign)
+    # A sum is order-independent, so the fingerprint follows inserts and deletes alike
+    aggs = snapshot.aggs
+    aggs["fingerprint"] = (aggs["fingerprint"] + sign * _record_hash(section, record)) % _FINGERPRINT_MOD
+
+def build(data):
+    """Aggregates of a {section: records} dict, in one pass over the records."""
+    snapshot = _Snapshot(empty(), fresh=True)
+    for section in _FOLDERS:
+        for record in data.get(section, ()):
+            _fold(snapshot, section, record, 1)
+    return snapshot.aggs
+
+def apply_changes(aggs, changes):
+    """New aggregates with (section, old_record, new_record) changes folded in.
+
+    old_record is None for an insert and new_record is None for a delete.
+    aggs itself is left untouched (see _Snapshot for the cost).
+    """
+    snapshot = _Snapshot(aggs)
+    for section, old, new in changes:
+        if section not in _FOLDERS:
+            continue
+        if old is not None:
+            _fold(snapshot, section, old, -1)
+        if new is not None:
+            _fold(snapshot, section, new, 1)
+    return snapshot.aggs
+
+def changes_from_entries(entries, current):
+    """(section, old, new) changes for change-log entries diffed against current {section: records}."""
+    changes = []
+    old_by_section = {}
+    for entry in entries:
+        section = entry["section"]
+        if section not in old_by_section:
+            old_by_section[section] = {change_log.record_key(r, section): r for r in current.get(section, ())}
+        old = old_by_section[section].get(entry["id"])
+        changes.append((section, old, entry["record"] if entry["op"] == "put" else None))
+    return changes
+
+# ─── Store ───
+# Next to each user's aggregates the store keeps the log position they are
+# current up to (see data_manager.load_aggregates_for_user); None without a log.
+def get(store_key, user_id, source):
+    """(aggregates, log position) cached for the user if built from source, else None."""
+    with _lock:
+        cached = _store.get((store_key, user_id))
+        if cached is None or cached[0] != source:
+            return None
+        _stats["hits"] += 1
+        return cached[1], cached[2]
+
+def put(store_key, user_id, source, aggs, position=None):
+    with _lock:
+        _store[(store_key, user_id)] = (source, aggs, position)
+        _stats["builds"] += 1
+
+def update(store_key, user_id, source, changes, position=None):
+    """Fold changes into the user's cached aggregates and move them to position.
+
+    Drops them instead if they are stale.
+    """
+    with _lock:
+        cached = _store.get((store_key, user_id))
+        if cached is None:
+            return
+        if cached[0] != source:
+            del _store[(store_key, user_id)]
+            return
+        aggs = apply_changes(cached[1], changes) if changes else cached[1]
+        _store[(store_key, user_id)] = (source, aggs, position)
+        if changes:
+            _stats["updates"] += 1
+
+def drop(store_key, user_id):
+    with _lock:
+        _store.pop((store_key, user_id), None)
+
+def cache_stats():
+    with _lock:
+        return dict(_stats, cached_users=len(_store))
+
+# ─── Readers ───
+def data_version(aggs):
+    """Content fingerprint of the user's transactions and assets; changes whenever any of them does."""
+    return f"{aggs['fingerprint']:016x}"
+
+def top_country(asset_type):
+    """The country most of the type's assets are in (alphabetically first on ties)."""
+    return min(asset_type["countries"].items(), key=lambda kv: (-kv[1], kv[0]))[0]
+
+def amount_percentiles(aggs, points=(10, 50, 90)):
+    """Nearest-rank percentiles (and the max) of the amounts, to AMOUNT_DIGITS significant digits."""
+    histogram = aggs["amount_histogram"]
+    if not histogram:
+        return {}
+    buckets = sorted(histogram.items())
+    ranks = sorted((max(1, math.ceil(p / 100 * aggs["transactions"])), p) for p in points)
+    found = {}
+    seen = 0
+    for value, count in buckets:
+        seen += count
+        while ranks and ranks[0][0] <= seen:
+            found[ranks.pop(0)[1]] = value
+    result = {f"p{p}": found[p] for p in points}
+    result["max"] = buckets[-1][0]
+    return result
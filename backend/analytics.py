@@ -1,31 +1,20 @@
 import streamlit as st
 import json
-import os
-import plotly.express as px
 import pandas as pd
-import matplotlib.pyplot as plt
 from collections import Counter
-from matplotlib.ticker import MaxNLocator
-from .chatbot import llm  # Import the existing LLM
+from . import aggregates
+from . import llm_cache  # LLM calls go through the persistent response cache
+from . import prompt_context
+from .data_manager import load_aggregates_for_user, load_records_for_user
 import numpy as np
 
-DATA_PATH = "data/large_financial_data.json"
-
 #this function loads the data from the json file and filters it for the current user and returns
 def load_data():
-    if os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "r") as f:
-            data = json.load(f)
-            # Filtering here
-            if st.session_state.current_user_email:
-                filtered_transactions = [tx for tx in data.get("transactions", []) 
-                                      if tx.get("user_id") == st.session_state.current_user_email]
-                filtered_assets = [asset for asset in data.get("financial_assets", [])
-                                      if asset.get("user_id") == st.session_state.current_user_email]
-                data["transactions"] = filtered_transactions
-                data["financial_assets"] = filtered_assets
-            return data
-    return {}
+    # Read-only per-user records from the configured storage backend
+    data = load_records_for_user(st.session_state.current_user_email or None)
+    if data is None:
+        return {}
+    return data
 
 # creates a dataframe for name, risk and return of user's financial assets
 def get_return_risk_df(data):
@@ -39,7 +28,14 @@ def get_return_risk_df(data):
     } for a in assets])
 
 #using Counter here to count frequency of each category from the categories list
-def get_category_bar_data(data):
+def get_category_bar_data(data, aggs=None):
+    if aggs is not None:
+        # Precomputed per-category counts (backend/aggregates.py)
+        counts = Counter()
+        for category, (count, _) in aggs["categories"].items():
+            if category is not None:
+                counts[category.replace('_', ' ').upper()] += count
+        return counts
     txs = data.get("transactions", [])
     categories = [t["category"].replace('_', ' ').upper() for t in txs if "category" in t]
     return Counter(categories)
@@ -51,23 +47,86 @@ def _format_asset_type(asset_type):
     formatted = ' '.join(word.upper() for word in words)
     return formatted
 
-def get_asset_distribution_df(data):
+# ─── Per-user frames ───
+# The dashboard aggregates are all derived from two frames built once per
+# render: one row per asset, and one row per asset and year of historical
+# performance. Everything below is groupby / vectorized ops on those.
+ASSET_COLUMNS = ["Name", "Type", "Country", "Return", "Risk", "Min Investment"]
+HISTORY_COLUMNS = ["Name", "Type", "Country", "Year", "Return"]
+
+def _parse_percent(values):
+    """'12.3%' strings (or plain numbers) to a float array, for records not yet normalized.
+
+    Returns repeat a lot across assets, so only the distinct values are parsed.
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object).astype(str).str.rstrip('%'), errors="coerce")
+    return np.where(codes < 0, np.nan, parsed.to_numpy(dtype=float)[codes])
+
+def get_assets_df(data):
+    """One row per asset, in the order of data["financial_assets"]."""
     assets = data.get("financial_assets", [])
     if not assets:
-        return pd.DataFrame(columns=["Type", "Count", "Avg Return", "Country"])
-    
-    # Group by asset type and calculate metrics
-    asset_data = []
-    for asset_type in set(a["type"] for a in assets):
-        type_assets = [a for a in assets if a["type"] == asset_type]
-        asset_data.append({
+        return pd.DataFrame(columns=ASSET_COLUMNS)
+    df = pd.DataFrame.from_records(
+        assets, columns=["name", "type", "country", "expected_return", "risk_rating", "minimum_investment_amount"])
+    df.columns = ASSET_COLUMNS
+    df["Return"] = pd.to_numeric(df["Return"], errors="coerce").fillna(0.0)
+    df["Min Investment"] = pd.to_numeric(df["Min Investment"], errors="coerce").fillna(0)
+    return df
+
+def _returns_by_year(asset):
+    # historical_returns is the numeric copy backend/normalize.py stores at ingest
+    details = asset.get("financial_details") or {}
+    return details.get("historical_returns") or details.get("historical_performance") or {}
+
+def get_history_df(data, assets_df=None):
+    """One row per asset and year of historical_performance, in asset order; missing countries are "Unknown"."""
+    assets = data.get("financial_assets", [])
+    if assets_df is None:
+        assets_df = get_assets_df(data)
+    wide = pd.DataFrame.from_records([_returns_by_year(a) for a in assets])
+    if wide.empty or wide.columns.empty:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    wide.columns = wide.columns.astype(int)
+    long = wide.stack()  # drops the years an asset has no entry for
+    rows = long.index.get_level_values(0).to_numpy()
+    df = assets_df.assign(Country=assets_df["Country"].fillna("Unknown")).iloc[rows][["Name", "Type", "Country"]]
+    df = df.reset_index(drop=True)
+    df["Year"] = long.index.get_level_values(1).to_numpy()
+    # Normalized records give float columns; strings only remain in data not yet backfilled
+    if pd.api.types.is_float_dtype(long):
+        df["Return"] = long.to_numpy()
+    else:
+        df["Return"] = _parse_percent(long.to_numpy())
+    return df.dropna(subset=["Return"])
+
+def get_asset_distribution_df(data, assets_df=None, aggs=None):
+    columns = ["Type", "Count", "Avg Return", "Country"]
+    if aggs is not None:
+        return pd.DataFrame([{
             "Type": _format_asset_type(asset_type),
-            "Count": len(type_assets),
-            "Avg Return": sum(a["expected_return"] for a in type_assets) / len(type_assets),
-            "Country": type_assets[0].get("country", "N/A")
-        })
+            "Count": stats["count"],
+            "Avg Return": stats["return_sum"] / stats["count"],
+            "Country": aggregates.top_country(stats)
+        } for asset_type, stats in aggs["asset_types"].items()], columns=columns)
+    if assets_df is None:
+        assets_df = get_assets_df(data)
+    if assets_df.empty:
+        return pd.DataFrame(columns=columns)
     
-    return pd.DataFrame(asset_data)
+    # Group by asset type; Country is where most of the type's assets are (first alphabetically on ties)
+    grouped = assets_df.groupby("Type", sort=False)
+    by_country = assets_df.assign(Country=assets_df["Country"].fillna("N/A")).groupby(["Type", "Country"]).size()
+    top_country = (by_country.reset_index(name="n").sort_values("n", ascending=False, kind="stable")
+                   .drop_duplicates("Type").set_index("Type")["Country"])
+    df = pd.DataFrame({
+        "Count": grouped.size(),
+        "Avg Return": grouped["Return"].mean(),
+        "Country": top_country
+    }).reset_index()
+    df["Type"] = df["Type"].map(_format_asset_type)
+    return df[columns]
 
 def _convert_to_native_types(obj):
     """Convert NumPy types to Python native types for JSON serialization."""
@@ -83,7 +142,23 @@ def _convert_to_native_types(obj):
         return [_convert_to_native_types(item) for item in obj]
     return obj
 
-def get_ai_recommendations(data, df_assets=None, bar_data=None, recommendation_type="assets"):
+def user_data_version():
+    """Version of the current user's whole dataset, which every insight is cached against.
+
+    Not the subset a chart passes in: llm_cache keeps one version per user,
+    so charts with different subsets would evict each other's answers.
+    Read from the aggregates, which keep the fingerprint current on every save.
+    """
+    return aggregates.data_version(load_aggregates_for_user(st.session_state.current_user_email or None))
+
+def _invoke_cached(messages, site, data_version=None):
+    # Unchanged prompt and unchanged user data: reuse the stored answer, no LLM round-trip
+    user_id = st.session_state.current_user_email or None
+    version = data_version or user_data_version()
+    return llm_cache.cached_invoke(messages, user_id, version, site=site)
+
+def get_ai_recommendations(data, df_assets=None, bar_data=None, recommendation_type="assets", aggs=None,
+                           data_version=None):
     # Prepare context for the AI
     context = {}
     
@@ -93,15 +168,8 @@ def get_ai_recommendations(data, df_assets=None, bar_data=None, recommendation_t
         if not assets:
             return ["No assets found to generate recommendations."]
             
-        context = {
-            "assets": assets,
-            "asset_distribution": df_assets.to_dict('records') if df_assets is not None else [],
-            "total_assets": len(assets),
-            "asset_types": [a["type"] for a in assets],
-            "risk_ratings": [a["risk_rating"] for a in assets],
-            "expected_returns": [a["expected_return"] for a in assets],
-            "countries": [a.get("country", "Unknown") for a in assets]
-        }
+        # Summary statistics rather than every raw asset, kept under the token budget
+        context = prompt_context.asset_context(data, df_assets)
         
         prompt = f"""As a financial advisor, analyze the following asset portfolio data and provide 2-3 specific, actionable recommendations.
 Focus on portfolio optimization and risk management based on the user's current assets.
@@ -119,18 +187,12 @@ Format each recommendation with an appropriate emoji and keep it under 2 sentenc
 
     else:  # spending recommendations
         # For spending-based recommendations
-        transactions = data.get("transactions", [])
-        if not transactions:
+        has_transactions = aggs["transactions"] if aggs is not None else data.get("transactions")
+        if not has_transactions:
             return ["No transaction data found to generate recommendations."]
             
-        context = {
-            "transactions": transactions,
-            "spending_categories": dict(bar_data) if bar_data else {},
-            "total_transactions": len(transactions),
-            "categories": list(bar_data.keys()) if bar_data else [],
-            "total_spend": sum(t.get("amount", 0) for t in transactions),
-            "currencies": list(set(t.get("currency", "Unknown") for t in transactions))
-        }
+        # Per-category totals, percentiles and top merchants rather than every transaction
+        context = prompt_context.spending_context(data, bar_data, aggs=aggs)
         
         prompt = f"""As a financial advisor, analyze the following spending data and provide 2-3 specific, actionable recommendations.
 Focus on spending patterns and potential areas for optimization.
@@ -154,56 +216,43 @@ Format each recommendation with an appropriate emoji and keep it under 2 sentenc
     ]
     
     try:
-        response = llm.invoke(messages)
+        site = "asset_recs" if recommendation_type == "assets" else "spending_recs"
+        content = _invoke_cached(messages, site, data_version)
         # Split the response into individual recommendations
-        recommendations = [rec.strip() for rec in response.content.split('\n') if rec.strip()]
+        recommendations = [rec.strip() for rec in content.split('\n') if rec.strip()]
         return recommendations if recommendations else ["Unable to generate specific recommendations at this time."]
     except Exception as e:
         st.error(f"Error generating AI recommendations: {str(e)}")
         return ["Unable to generate AI recommendations at this time."]
 
-def get_historical_performance_df(data, by_type=False):
-    assets = data.get("financial_assets", [])
-    if not assets:
+def get_historical_performance_df(data, by_type=False, history_df=None):
+    if history_df is None:
+        history_df = get_history_df(data)
+    if history_df.empty:
         return pd.DataFrame()
     
-    # Create a list to store all performance data
-    performance_data = []
-    
-    for asset in assets:
-        if "financial_details" in asset and "historical_performance" in asset["financial_details"]:
-            hist_perf = asset["financial_details"]["historical_performance"]
-            for year, return_str in hist_perf.items():
-                # Convert percentage string to float
-                return_value = float(return_str.strip('%'))
-                performance_data.append({
-                    "Asset": asset["name"] if not by_type else _format_asset_type(asset["type"]),
-                    "Year": int(year),
-                    "Return": return_value
-                })
-    
-    df = pd.DataFrame(performance_data)
-    
     if by_type:
         # Calculate average returns by type and year
-        df = df.groupby(['Asset', 'Year'])['Return'].mean().reset_index()
-    
-    return df
-
-def get_historical_performance_insight(data, hist_df, view_type):
+        df = history_df.groupby(["Type", "Year"])["Return"].mean().reset_index()
+        df["Type"] = df["Type"].map(_format_asset_type)
+        return df.rename(columns={"Type": "Asset"})
+    return history_df[["Name", "Year", "Return"]].rename(columns={"Name": "Asset"})
+
+def get_country_history_df(data, history_df=None):
+    """Average return per country and year."""
+    if history_df is None:
+        history_df = get_history_df(data)
+    if history_df.empty:
+        return pd.DataFrame(columns=["Country", "Year", "Return"])
+    return history_df.groupby(["Country", "Year"])["Return"].mean().reset_index()
+
+def get_historical_performance_insight(data, hist_df, view_type, data_version=None):
     # Validate data
     if hist_df.empty:
         return "No historical performance data available to generate insights."
         
     # Prepare context for the AI
-    context = {
-        "view_type": view_type,
-        "performance_data": hist_df.to_dict('records'),
-        "assets": data.get("financial_assets", []),
-        "years": sorted(hist_df["Year"].unique()),
-        "assets_list": sorted(hist_df["Asset"].unique()),
-        "avg_returns": hist_df.groupby("Year")["Return"].mean().to_dict()
-    }
+    context = prompt_context.historical_context(data, hist_df, view_type)
     
     # Create a prompt for the AI
     prompt = f"""As a financial advisor, analyze the following historical performance data and provide a brief, actionable insight.
@@ -227,59 +276,43 @@ Format the insight with an appropriate emoji and keep it under 2 sentences."""
     ]
     
     try:
-        response = llm.invoke(messages)
+        content = _invoke_cached(messages, "hist_insight", data_version)
         # Clean the response to remove any internal newlines that might break formatting
-        cleaned_response = response.content.strip().replace('\n', ' ')
+        cleaned_response = content.strip().replace('\n', ' ')
         return cleaned_response
     except Exception as e:
         st.error(f"Error generating AI insight: {str(e)}")
         return "Unable to generate AI insight at this time."
 
-def get_country_distribution_df(data):
-    assets = data.get("financial_assets", [])
-    if not assets:
-        return pd.DataFrame(columns=["Country", "Count", "Avg Return", "Total Value"])
-    
-    # Group by country and calculate metrics
-    country_data = {}
-    for asset in assets:
-        country = asset.get("country", "Unknown")
-        if country not in country_data:
-            country_data[country] = {
-                "Count": 0,
-                "Total Return": 0,
-                "Total Value": 0
-            }
-        country_data[country]["Count"] += 1
-        country_data[country]["Total Return"] += asset.get("expected_return", 0)
-        country_data[country]["Total Value"] += asset.get("minimum_investment_amount", 0)
-    
-    # Calculate averages and create DataFrame
-    country_metrics = []
-    for country, metrics in country_data.items():
-        country_metrics.append({
+def get_country_distribution_df(data, assets_df=None, aggs=None):
+    columns = ["Country", "Count", "Avg Return", "Total Value"]
+    if aggs is not None:
+        return pd.DataFrame([{
             "Country": country,
-            "Count": metrics["Count"],
-            "Avg Return": metrics["Total Return"] / metrics["Count"],
-            "Total Value": metrics["Total Value"]
-        })
+            "Count": stats["count"],
+            "Avg Return": stats["return_sum"] / stats["count"],
+            "Total Value": stats["value_sum"]
+        } for country, stats in aggs["countries"].items()], columns=columns)
+    if assets_df is None:
+        assets_df = get_assets_df(data)
+    if assets_df.empty:
+        return pd.DataFrame(columns=columns)
     
-    return pd.DataFrame(country_metrics)
-
-def get_country_insight(data, country_df):
+    # Group by country and calculate metrics
+    countries = assets_df["Country"].fillna("Unknown")
+    return assets_df.groupby(countries, sort=False).agg(**{
+        "Count": ("Return", "size"),
+        "Avg Return": ("Return", "mean"),
+        "Total Value": ("Min Investment", "sum")
+    }).reset_index()
+
+def get_country_insight(data, country_df, data_version=None):
     # Validate data
     if country_df.empty:
         return "No country distribution data available to generate insights."
         
     # Prepare context for the AI
-    context = {
-        "country_distribution": country_df.to_dict('records'),
-        "assets": data.get("financial_assets", []),
-        "total_assets": len(data.get("financial_assets", [])),
-        "countries": country_df["Country"].tolist(),
-        "asset_counts": country_df.set_index("Country")["Count"].to_dict(),
-        "avg_returns": country_df["Avg Return"].to_dict()
-    }
+    context = prompt_context.country_context(data, country_df)
     
     # Create a prompt for the AI
     prompt = f"""As a financial advisor, analyze the following country-wise asset distribution by count and provide a brief, actionable insight.
@@ -303,17 +336,27 @@ Format the insight with an appropriate emoji and keep it under 2 sentences."""
     ]
     
     try:
-        response = llm.invoke(messages)
+        content = _invoke_cached(messages, "country_insight", data_version)
         # Clean the response to remove any internal newlines that might break formatting
-        cleaned_response = response.content.strip().replace('\n', ' ')
+        cleaned_response = content.strip().replace('\n', ' ')
         return cleaned_response
     except Exception as e:
         st.error(f"Error generating country insight: {str(e)}")
         return "Unable to generate country insight at this time."
 
 def display_analytics():
+    # Only the dashboard draws charts, so matplotlib loads when it is first shown
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+
     st.header("📊 Investment Analytics Dashboard")
+    # The KPIs and the country, type and category charts read only the
+    # aggregates the writers maintain; the record frames are built for the
+    # history chart alone
+    aggs = load_aggregates_for_user(st.session_state.current_user_email or None)
     data = load_data()
+    # One version for every insight on the page (see user_data_version)
+    data_version = aggregates.data_version(aggs)
 
     # Define a consistent color palette with high contrast
     colors = {
@@ -348,21 +391,14 @@ def display_analytics():
     # ─── KPI Metrics ───
     st.subheader("📈 System Metrics")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Transactions", len(data.get("transactions", [])))
-    col2.metric("Financial Assets", len(data.get("financial_assets", [])))
+    col1.metric("Total Transactions", aggs["transactions"])
+    col2.metric("Financial Assets", aggs["assets"])
     
-    # Calculate country distribution
-    assets = data.get("financial_assets", [])
-    country_distribution = {}
-    for asset in assets:
-        country = asset.get("country", "Unknown")
-        country_distribution[country] = country_distribution.get(country, 0) + 1
-    
-    col3.metric("Countries", len(country_distribution))
-
     # ─── Country Distribution Section ───
+    country_df = get_country_distribution_df(data, aggs=aggs)
+    col3.metric("Countries", len(country_df))
+
     st.subheader("🌍 Asset Distribution by Country")
-    country_df = get_country_distribution_df(data)
     if not country_df.empty:
         # Create a figure with two subplots
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 5))
@@ -410,7 +446,7 @@ def display_analytics():
         # Show AI-generated country insight
         st.subheader("💡 AI Country Distribution Insight")
         with st.spinner("Analyzing geographical distribution..."):
-            insight = get_country_insight(data, country_df)
+            insight = get_country_insight(data, country_df, data_version)
             st.write(insight)
     else:
         st.info("No country distribution data available.")
@@ -426,7 +462,9 @@ def display_analytics():
         key="historical_view"
     )
     
-    hist_df = get_historical_performance_df(data, by_type=(view_type == "Average by Asset Type"))
+    history_df = get_history_df(data)
+    hist_df = get_historical_performance_df(data, by_type=(view_type == "Average by Asset Type"),
+                                            history_df=history_df)
     if not hist_df.empty:
         fig, ax = plt.subplots(figsize=(10, 4))
         
@@ -435,23 +473,10 @@ def display_analytics():
         ax.set_facecolor(colors['background'])
         
         if view_type == "By Country":
-            # Group by country and calculate average returns
-            country_data = {}
-            for asset in assets:
-                country = asset.get("country", "Unknown")
-                if "financial_details" in asset and "historical_performance" in asset["financial_details"]:
-                    for year, return_str in asset["financial_details"]["historical_performance"].items():
-                        if country not in country_data:
-                            country_data[country] = {}
-                        if year not in country_data[country]:
-                            country_data[country][year] = []
-                        country_data[country][year].append(float(return_str.strip('%')))
-            
-            # Calculate averages and plot
-            for i, (country, year_data) in enumerate(country_data.items()):
-                years = sorted(year_data.keys())
-                avg_returns = [sum(year_data[year]) / len(year_data[year]) for year in years]
-                ax.plot(years, avg_returns, marker='o', label=country, 
+            # Average returns per country and year
+            country_hist_df = get_country_history_df(data, history_df)
+            for i, (country, year_data) in enumerate(country_hist_df.groupby("Country")):
+                ax.plot(year_data["Year"], year_data["Return"], marker='o', label=country, 
                        color=colors['primary'][i % len(colors['primary'])],
                        linewidth=2,
                        markersize=8)
@@ -512,14 +537,15 @@ def display_analytics():
         # Show AI-generated insight
         st.subheader("💡 AI Performance Insight")
         with st.spinner("Analyzing performance trends..."):
-            insight = get_historical_performance_insight(filtered_data, filtered_hist_df, view_type)
+            insight = get_historical_performance_insight(filtered_data, filtered_hist_df, view_type,
+                                                         data_version)
             st.write(insight)
     else:
         st.info("No historical performance data available.")
 
     # ─── Asset Distribution Chart ───
     st.subheader("📊 Asset Distribution & Returns")
-    df_assets = get_asset_distribution_df(data)
+    df_assets = get_asset_distribution_df(data, aggs=aggs)
     if not df_assets.empty:
         # Create a figure with two subplots
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(9, 3))
@@ -579,7 +605,8 @@ def display_analytics():
         # Show AI-generated recommendations
         st.subheader("🤖 AI-Powered Portfolio Recommendations")
         with st.spinner("Generating personalized portfolio recommendations..."):
-            recommendations = get_ai_recommendations(filtered_data, df_assets=filtered_df_assets, recommendation_type="assets")
+            recommendations = get_ai_recommendations(filtered_data, df_assets=filtered_df_assets, recommendation_type="assets",
+                                                     data_version=data_version)
             for rec in recommendations:
                 st.write(rec)
     else:
@@ -587,7 +614,7 @@ def display_analytics():
 
     # ─── Candlestick-style Bar Chart: Spending by Category ───
     st.subheader("📊 Spending by Category")
-    bar_data = get_category_bar_data(data)
+    bar_data = get_category_bar_data(data, aggs)
     if bar_data:
         df_bar = pd.DataFrame(bar_data.items(), columns=["Category", "Count"]).sort_values(by="Count", ascending=False)
         fig, ax = plt.subplots(figsize=(6, 2))
@@ -609,7 +636,8 @@ def display_analytics():
         # Show AI-generated spending recommendations
         st.subheader("🤖 AI-Powered Spending Insights")
         with st.spinner("Analyzing spending patterns..."):
-            spending_recommendations = get_ai_recommendations(data, bar_data=bar_data, recommendation_type="spending")
+            spending_recommendations = get_ai_recommendations(data, bar_data=bar_data, recommendation_type="spending",
+                                                              aggs=aggs, data_version=data_version)
             for rec in spending_recommendations:
                 st.write(rec)
     else:
@@ -0,0 +1,68 @@
+# backend/atomic_io.py
+#
+# Crash- and reader-safe file publishing helpers shared by the storage modules.
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+def _publish(path, write):
+    """Write to a temp file in the same directory, fsync it, then rename over path.
+
+    Readers see either the old file or the new one, never a half-written file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def atomic_write_json(path, data, indent=None):
+    _publish(path, lambda f: json.dump(data, f, indent=indent))
+
+def atomic_write_lines(path, lines):
+    _publish(path, lambda f: f.writelines(lines))
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        if path not in _thread_locks:
+            _thread_locks[path] = threading.Lock()
+        return _thread_locks[path]
+
+@contextmanager
+def file_lock(path):
+    """Exclusive writer lock across threads and processes, held via path + '.lock'."""
+    lock_path = path + ".lock"
+    with _thread_lock(lock_path):
+        with open(lock_path, "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -1,9 +1,15 @@
 import streamlit as st
 import json
 import os
+from .atomic_io import atomic_write_json
 
 USER_FILE = "backend/users.json"
 
+# Same switch as sql_store.is_enabled; sql_store (and SQLAlchemy with it) is
+# only imported when it is on, so the login page stays light in JSON mode
+def _sql_enabled():
+    return os.getenv("FINPILOT_STORAGE", "json").lower() == "sqlite"
+
 # Ensure the file exists
 if not os.path.exists(USER_FILE):
     with open(USER_FILE, "w") as f:
@@ -11,16 +17,28 @@ if not os.path.exists(USER_FILE):
 
 # Load users from file
 def load_users():
+    if _sql_enabled():
+        from . import sql_store
+        return sql_store.load_users()
     with open(USER_FILE, "r") as f:
         return json.load(f)
 
 # Save users to file
 def save_users(users):
-    with open(USER_FILE, "w") as f:
-        json.dump(users, f)
+    atomic_write_json(USER_FILE, users)
 
 # Register a new user
 def register_user(email, password):
+    if _sql_enabled():
+        # The primary key rejects the email if it is taken, even by a concurrent registration
+        from . import sql_store
+        try:
+            sql_store.save_user(email, password)
+        except sql_store.IntegrityError:
+            st.warning("🚫 User already exists.")
+            return
+        st.success("✅ User registered successfully.")
+        return
     users = load_users()
     if email in users:
         st.warning("🚫 User already exists.")
@@ -31,8 +49,12 @@ def register_user(email, password):
 
 # Authenticate user
 def login_user(email, password):
-    users = load_users()
-    if users.get(email) == password:
+    if _sql_enabled():
+        from . import sql_store
+        stored_password = sql_store.get_user_password(email)
+    else:
+        stored_password = load_users().get(email)
+    if stored_password == password:
         st.session_state.current_user_email = email
         return True
     return False
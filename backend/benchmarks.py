@@ -0,0 +1,520 @@
+# backend/benchmarks.py
+#
+# Micro-benchmarks for the data paths. Run one with:
+#   python -m backend.benchmarks user_load --users 10 100 1000
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import numpy as np
+from . import change_log, columnar_store, data_manager, dataset_cache, json_stream, prompt_context, vector_store
+from .data_generator import generate_dataset, generate_transaction
+from .data_manager import save_records_for_user
+
+def _write_dataset(dataset, path):
+    financial_data = {
+        "transactions": dataset["transactions"],
+        "financial_assets": dataset["financial_assets"],
+        "investment_strategies": dataset["investment_strategies"]
+    }
+    with open(path, "w") as f:
+        json.dump(financial_data, f)
+
+def _median_ms(fn, args_list):
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def bench_user_load(user_counts=(10, 100, 1000), transactions_per_user=50, samples=20):
+    """Per-user load time from the indexed columnar store vs. a full JSON scan."""
+    print(f"{'users':>7} | {'rows':>8} | {'columnar (ms)':>13} | {'json scan (ms)':>14}")
+    for num_users in user_counts:
+        dataset = generate_dataset(num_users=num_users, transactions_per_user=transactions_per_user,
+                                   assets_per_user=5, num_strategies=20)
+        users = list(dataset["users"])[:samples]
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, "data.json")
+            store_dir = os.path.join(tmp, "columnar")
+            _write_dataset(dataset, json_path)
+            columnar_store.convert_json_to_columnar(json_path, store_dir)
+
+            def json_scan(user_id):
+                with open(json_path, "r") as f:
+                    data = json.load(f)
+                return [tx for tx in data["transactions"] if tx.get("user_id") == user_id]
+
+            columnar_ms = _median_ms(columnar_store.load_user_records,
+                                     [(u, store_dir) for u in users])
+            json_ms = _median_ms(json_scan, [(u,) for u in users[:3]])
+        print(f"{num_users:>7} | {len(dataset['transactions']):>8} | {columnar_ms:>13.2f} | {json_ms:>14.2f}")
+
+def _peak_mb(fn, *args):
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+def _stream_save(user_id, json_path):
+    """One save in stream mode: a changed transaction, diffed against a streamed load."""
+    previous = data_manager.LOAD_MODE
+    data_manager.LOAD_MODE = "stream"
+    try:
+        data = data_manager.load_records_for_user(user_id, json_path)
+        data["transactions"][0] = dict(data["transactions"][0], amount=1.0)
+        save_records_for_user(user_id, data, json_path)
+    finally:
+        data_manager.LOAD_MODE = previous
+
+def bench_memory(user_counts=(100, 500, 1000), transactions_per_user=100):
+    """Peak Python heap for one user: json.load + filter vs. the streaming loader, and a stream-mode save."""
+    print(f"{'users':>7} | {'file (MB)':>9} | {'json.load (MB)':>14} | {'streaming (MB)':>14} | "
+          f"{'stream save (MB)':>16}")
+    for num_users in user_counts:
+        dataset = generate_dataset(num_users=num_users, transactions_per_user=transactions_per_user,
+                                   assets_per_user=5, num_strategies=20)
+        user_id = next(iter(dataset["users"]))
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, "data.json")
+            _write_dataset(dataset, json_path)
+            del dataset
+
+            def full_load():
+                with open(json_path, "r") as f:
+                    data = json.load(f)
+                return [tx for tx in data["transactions"] if tx.get("user_id") == user_id]
+
+            file_mb = os.path.getsize(json_path) / (1024 * 1024)
+            full_mb = _peak_mb(full_load)
+            stream_mb = _peak_mb(json_stream.load_filtered, json_path, user_id,
+                                 columnar_store.USER_SECTIONS)
+            save_mb = _peak_mb(_stream_save, user_id, json_path)
+        print(f"{num_users:>7} | {file_mb:>9.1f} | {full_mb:>14.1f} | {stream_mb:>14.2f} | {save_mb:>16.2f}")
+
+def stress_saves_and_loads(num_users=8, writers_per_user=2, readers=8, seconds=5.0):
+    """Hammer concurrent saves, loads and compactions; fail on any torn or lost read.
+
+    Every writer flips its user between two states: the original transactions,
+    or the originals minus the first one plus one new transaction. A reader
+    must always see exactly one of those states, and so must the snapshot
+    left on disk by a final compaction.
+    """
+    dataset = generate_dataset(num_users=num_users, transactions_per_user=20, assets_per_user=3,
+                               num_strategies=5)
+    users = list(dataset["users"])
+    originals = {
+        u: [tx for tx in dataset["transactions"] if tx["user_id"] == u] for u in users
+    }
+    original_ids = {u: {tx["transaction_id"] for tx in txs} for u, txs in originals.items()}
+    stop = threading.Event()
+    errors = []
+    counts = {"saves": 0, "loads": 0, "compactions": 0}
+    counts_lock = threading.Lock()
+
+    def check(user_id, view):
+        ids = {tx["transaction_id"] for tx in view["transactions"]}
+        extra = ids - original_ids[user_id]
+        missing = original_ids[user_id] - ids
+        first_id = originals[user_id][0]["transaction_id"]
+        if extra or missing:
+            if len(extra) != 1 or missing != {first_id}:
+                errors.append(f"{user_id}: torn read, +{len(extra)} -{len(missing)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "data.json")
+        _write_dataset(dataset, data_path)
+        log_path = change_log.log_path_for(data_path)
+
+        def writer(user_id, n):
+            i = 0
+            while not stop.is_set():
+                txs = originals[user_id]
+                if i % 2:
+                    new_tx = generate_transaction(user_id, "-1y", "now")
+                    new_tx["transaction_id"] = f"{user_id}-{n}-{i}"
+                    txs = txs[1:] + [new_tx]
+                save_records_for_user(user_id, {"transactions": txs}, data_path)
+                i += 1
+                with counts_lock:
+                    counts["saves"] += 1
+
+        def reader(n):
+            i = n
+            while not stop.is_set():
+                user_id = users[i % len(users)]
+                check(user_id, dataset_cache.get_user_view(user_id, data_path))
+                i += 1
+                with counts_lock:
+                    counts["loads"] += 1
+
+        def compactor():
+            while not stop.is_set():
+                time.sleep(0.05)
+                if change_log.compact(data_path, log_path):
+                    with counts_lock:
+                        counts["compactions"] += 1
+
+        threads = [threading.Thread(target=writer, args=(u, n))
+                   for u in users for n in range(writers_per_user)]
+        threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        threads.append(threading.Thread(target=compactor))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        change_log.compact(data_path, log_path)
+        with open(data_path, "r") as f:
+            final = json.load(f)
+        for user_id in users:
+            check(user_id, {"transactions": [tx for tx in final["transactions"] if tx["user_id"] == user_id]})
+        stats = change_log.writer_stats(log_path)
+
+    print(f"{counts['saves']} saves ({stats['fsyncs']} fsyncs), {counts['loads']} loads, "
+          f"{counts['compactions']} compactions")
+    if errors:
+        print(f"[!] {len(errors)} inconsistent reads, e.g. {errors[0]}")
+        raise SystemExit(1)
+    print("[OK] every read saw a committed state")
+
+def _clustered_vectors(rng, n, dim, spread=0.3):
+    # Real sentence embeddings are clumpy, not uniform, which is what IVF relies on
+    centers = rng.normal(size=(max(1, n // 100), dim)).astype("float32")
+    return centers[rng.integers(len(centers), size=n)] + spread * rng.normal(size=(n, dim)).astype("float32")
+
+def bench_ann(sizes=(10_000, 100_000), dim=384, num_queries=200, k=10):
+    """Recall@k against the exact flat index plus single-query p50/p99 latency per index type."""
+    settings = [
+        ("flat", {}),
+        *[("ivf_flat", {"nprobe": p}) for p in (1, 4, 16, 64)],
+        *[("hnsw", {"ef_search": ef}) for ef in (16, 64, 256)],
+        *[("ivf_pq", {"nprobe": p}) for p in (4, 16, 64)]
+    ]
+    rng = np.random.default_rng(0)
+    print(f"{'vectors':>8} | {'index':>8} | {'setting':>13} | {'build (s)':>9} | "
+          f"{'recall@' + str(k):>9} | {'p50 (ms)':>8} | {'p99 (ms)':>8}")
+    for n in sizes:
+        data = _clustered_vectors(rng, n, dim)
+        queries = data[rng.choice(n, num_queries)] + 0.1 * rng.normal(size=(num_queries, dim)).astype("float32")
+        _, truth = vector_store.build_index(data, "flat").search(queries, k)
+
+        built = {}
+        for index_type, params in settings:
+            if index_type not in built:
+                start = time.perf_counter()
+                built[index_type] = (vector_store.build_index(data, index_type), time.perf_counter() - start)
+            index, build_s = built[index_type]
+            vector_store.configure_search(index, **params)
+
+            latencies = []
+            hits = 0
+            for i, query in enumerate(queries):
+                start = time.perf_counter()
+                _, rows = index.search(query[None, :], k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(set(rows[0].tolist()) & set(truth[i].tolist()))
+            p50, p99 = np.percentile(latencies, [50, 99])
+            setting = ", ".join(f"{key}={value}" for key, value in params.items()) or "exact"
+            print(f"{n:>8} | {index_type:>8} | {setting:>13} | {build_s:>9.2f} | "
+                  f"{hits / (k * num_queries):>9.3f} | {p50:>8.3f} | {p99:>8.3f}")
+
+# Modules whose presence after a page render means the model stack was loaded
+HEAVY_MODULES = ("langchain_openai", "langchain_community", "sentence_transformers", "torch",
+                 "faiss", "matplotlib", "plotly", "pandas")
+
+# Streamlit itself imports some of HEAVY_MODULES (plotly), and every page
+# pays for that anyway: the probes import it first and only report the rest
+_IMPORT_PROBE = """
+import json, sys, time
+import streamlit
+baseline = set(sys.modules)
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules and m not in baseline]}}))
+"""
+
+_LOGIN_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+baseline = set(sys.modules)
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("app.py", default_timeout=300).run()
+seconds = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules and m not in baseline]
+from backend.llm import is_loaded
+print(json.dumps({{"seconds": seconds, "heavy": heavy, "models": is_loaded(),
+                  "errors": [str(e.value) for e in app.exception]}}))
+"""
+
+def _probe(code):
+    # A fresh interpreter per measurement, so nothing is already imported
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def bench_startup(modules=("backend.auth", "backend.data_manager", "backend.chatbot", "backend.analytics"),
+                  samples=3):
+    """Cold import time per module (on top of streamlit) and time for app.py to render the login page.
+
+    Run from the repo root. Heavy modules are the ones loaded beyond what
+    importing streamlit loads by itself.
+    """
+    print(f"{'import':>22} | {'median (s)':>10} | heavy modules loaded")
+    for module in modules:
+        runs = [_probe(_IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)) for _ in range(samples)]
+        median = statistics.median(run["seconds"] for run in runs)
+        print(f"{module:>22} | {median:>10.2f} | {', '.join(runs[-1]['heavy']) or '-'}")
+
+    runs = [_probe(_LOGIN_PROBE.format(heavy=HEAVY_MODULES)) for _ in range(samples)]
+    last = runs[-1]
+    print(f"\nLogin page render: {statistics.median(run['seconds'] for run in runs):.2f}s (median of {samples})")
+    print(f"- heavy modules loaded: {', '.join(last['heavy']) or 'none'}")
+    print(f"- models created: {', '.join(name for name, loaded in last['models'].items() if loaded) or 'none'}")
+    if last["errors"]:
+        print(f"[!] app raised: {last['errors'][0]}")
+
+def _raw_contexts(data, analytics):
+    """The analytics prompt contexts as they were built before prompt_context: raw records included."""
+    assets, transactions = data["financial_assets"], data["transactions"]
+    df_assets = analytics.get_asset_distribution_df(data)
+    bar_data = analytics.get_category_bar_data(data)
+    hist_df = analytics.get_historical_performance_df(data)
+    country_df = analytics.get_country_distribution_df(data)
+    return {
+        "asset_recs": {
+            "assets": assets, "asset_distribution": df_assets.to_dict("records"), "total_assets": len(assets),
+            "asset_types": [a["type"] for a in assets], "risk_ratings": [a["risk_rating"] for a in assets],
+            "expected_returns": [a["expected_return"] for a in assets],
+            "countries": [a.get("country", "Unknown") for a in assets]
+        },
+        "spending_recs": {
+            "transactions": transactions, "spending_categories": dict(bar_data),
+            "total_transactions": len(transactions), "categories": list(bar_data.keys()),
+            "total_spend": sum(t.get("amount", 0) for t in transactions),
+            "currencies": list(set(t.get("currency", "Unknown") for t in transactions))
+        },
+        "hist_insight": {
+            "view_type": "Individual Assets", "performance_data": hist_df.to_dict("records"), "assets": assets,
+            "years": sorted(hist_df["Year"].unique()), "assets_list": sorted(hist_df["Asset"].unique()),
+            "avg_returns": hist_df.groupby("Year")["Return"].mean().to_dict()
+        },
+        "country_insight": {
+            "country_distribution": country_df.to_dict("records"), "assets": assets, "total_assets": len(assets),
+            "countries": country_df["Country"].tolist(),
+            "asset_counts": country_df.set_index("Country")["Count"].to_dict(),
+            "avg_returns": country_df["Avg Return"].to_dict()
+        }
+    }
+
+def bench_prompt_size(transaction_counts=(50, 500, 5000), assets_per_user=50, budget=prompt_context.PROMPT_TOKEN_BUDGET):
+    """Estimated prompt-context tokens per analytics call: raw records vs. the budgeted summaries."""
+    from . import analytics
+    print(f"{'transactions':>12} | {'prompt':>15} | {'raw (tokens)':>12} | {'summary (tokens)':>16}")
+    for count in transaction_counts:
+        dataset = generate_dataset(num_users=1, transactions_per_user=count, assets_per_user=assets_per_user,
+                                   num_strategies=5)
+        data = {"transactions": dataset["transactions"], "financial_assets": dataset["financial_assets"]}
+        raw = _raw_contexts(data, analytics)
+        hist_df = analytics.get_historical_performance_df(data)
+        summary = {
+            "asset_recs": prompt_context.asset_context(data, analytics.get_asset_distribution_df(data), budget),
+            "spending_recs": prompt_context.spending_context(data, analytics.get_category_bar_data(data), budget),
+            "hist_insight": prompt_context.historical_context(data, hist_df, "Individual Assets", budget),
+            "country_insight": prompt_context.country_context(data, analytics.get_country_distribution_df(data), budget)
+        }
+        for name in raw:
+            raw_tokens = prompt_context.estimate_tokens(json.dumps(analytics._convert_to_native_types(raw[name])))
+            summary_tokens = prompt_context.estimate_tokens(json.dumps(analytics._convert_to_native_types(summary[name])))
+            print(f"{count:>12} | {name:>15} | {raw_tokens:>12} | {summary_tokens:>16}")
+
+def bench_analytics_frames(asset_counts=(1_000, 10_000, 100_000), samples=3):
+    """Time to build the per-user analytics frames and every dashboard aggregate, per asset count."""
+    from . import analytics
+    from .data_generator import generate_financial_asset
+    # Generating assets is slow; tile a sample with distinct names instead
+    base = [generate_financial_asset("bench-user") for _ in range(2_000)]
+    print(f"{'assets':>8} | {'frames (ms)':>11} | {'aggregates (ms)':>15} | {'total (ms)':>10} | {'us/asset':>8}")
+    for n in asset_counts:
+        assets = [dict(base[i % len(base)], name=f"Asset {i}") for i in range(n)]
+        data = {"financial_assets": assets}
+
+        def frames():
+            assets_df = analytics.get_assets_df(data)
+            return assets_df, analytics.get_history_df(data, assets_df)
+
+        def aggregates(assets_df, history_df):
+            analytics.get_asset_distribution_df(data, assets_df)
+            analytics.get_country_distribution_df(data, assets_df)
+            analytics.get_historical_performance_df(data, history_df=history_df)
+            analytics.get_historical_performance_df(data, by_type=True, history_df=history_df)
+            analytics.get_country_history_df(data, history_df)
+
+        built = frames()
+        frames_ms = _median_ms(frames, [()] * samples)
+        aggregates_ms = _median_ms(aggregates, [built] * samples)
+        total = frames_ms + aggregates_ms
+        print(f"{n:>8} | {frames_ms:>11.1f} | {aggregates_ms:>15.1f} | {total:>10.1f} | {1000 * total / n:>8.2f}")
+
+def bench_aggregates(transaction_counts=(1_000, 10_000, 100_000), samples=20):
+    """Cost of keeping a user's analytics aggregates current: a full rebuild vs. folding in one save."""
+    from . import aggregates
+    print(f"{'transactions':>12} | {'rebuild (ms)':>12} | {'one change (ms)':>15}")
+    for count in transaction_counts:
+        txs = [generate_transaction("bench-user", "-1y", "now") for _ in range(count)]
+        data = {"transactions": txs}
+        aggs = aggregates.build(data)
+        changes = [[("transactions", txs[i], dict(txs[i], amount=txs[i]["amount"] + 1))] for i in range(samples)]
+        rebuild_ms = _median_ms(aggregates.build, [(data,)] * 3)
+        update_ms = _median_ms(aggregates.apply_changes, [(aggs, change) for change in changes])
+        print(f"{count:>12} | {rebuild_ms:>12.2f} | {update_ms:>15.3f}")
+
+def _timed_run(app):
+    start = time.perf_counter()
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return time.perf_counter() - start
+
+def bench_e2e(iterations=5, num_users=20, transactions_per_user=30, latency="lognormal:0.8,0.4",
+              tokens_per_second=60.0, error_rate=0.0, build_index=True):
+    """Page latency with the offline fake LLM and embedder: recommendations, one chat turn, analytics.
+
+    Runs in a scratch directory with a generated dataset, so the real data,
+    indexes and response cache are untouched. The first iteration starts with
+    an empty response cache; later ones show the cached cost.
+    """
+    os.environ.update({
+        "FINPILOT_LLM_PROVIDER": "fake",
+        "FINPILOT_EMBEDDING_PROVIDER": "fake",
+        "FINPILOT_FAKE_LLM_LATENCY": latency,
+        "FINPILOT_FAKE_LLM_TOKENS_PER_SEC": str(tokens_per_second),
+        "FINPILOT_FAKE_LLM_ERROR_RATE": str(error_rate)
+    })
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, repo_root)
+    from streamlit.testing.v1 import AppTest
+    from . import embeddings, llm_metrics
+
+    # Restored afterwards, so relative paths keep working once the scratch directory is gone
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs("data")
+            os.makedirs("backend")  # auth keeps backend/users.json relative to the working directory
+            dataset = generate_dataset(num_users=num_users, transactions_per_user=transactions_per_user)
+            _write_dataset(dataset, "data/large_financial_data.json")
+            if build_index:
+                embeddings.build_indexes("data/large_financial_data.json", num_workers=1)
+            user_id = dataset["transactions"][0]["user_id"]
+
+            timings = {"recommendations": [], "chat": [], "analytics": []}
+            for _ in range(iterations):
+                # A fresh session per iteration; the response cache persists between them
+                app = AppTest.from_file(os.path.join(repo_root, "app.py"), default_timeout=600)
+                app.session_state.authenticated = True
+                app.session_state.current_user_email = user_id
+                app.session_state.chat_open = True
+                _timed_run(app)
+                next(b for b in app.button if "Get Recommendations" in b.label).click()
+                timings["recommendations"].append(_timed_run(app))
+                app.sidebar.text_input(key="chat_input").input("How should I rebalance my portfolio?")
+                next(b for b in app.sidebar.button if b.label == "Send").click()
+                timings["chat"].append(_timed_run(app))
+                app.session_state.page = "Analytics"
+                timings["analytics"].append(_timed_run(app))
+        finally:
+            os.chdir(cwd)
+
+    print(f"Fake LLM latency {latency}, {tokens_per_second:g} tokens/s, error rate {error_rate:g}")
+    print(f"{'page':>15} | {'cold (s)':>8} | {'warm p50 (s)':>12} | {'warm p95 (s)':>12}")
+    for page, runs in timings.items():
+        warm = sorted(runs[1:]) or runs
+        p95 = warm[min(len(warm) - 1, int(0.95 * len(warm)))]
+        print(f"{page:>15} | {runs[0]:>8.2f} | {statistics.median(warm):>12.2f} | {p95:>12.2f}")
+    print(f"\n{'site':>18} | {'calls':>5} | {'hits':>4} | {'errors':>6} | {'p50 (s)':>7} | {'p95 (s)':>7}")
+    for row in llm_metrics.registry.snapshot():
+        print(f"{row['site']:>18} | {row['calls']:>5} | {row['cache_hits']:>4} | {row['errors']:>6} | "
+              f"{row['p50_s']:>7.3f} | {row['p95_s']:>7.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FinPilot benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    user_load = subparsers.add_parser("user_load", help="per-user load time as the user count grows")
+    user_load.add_argument("--users", type=int, nargs="+", default=[10, 100, 1000])
+    user_load.add_argument("--transactions-per-user", type=int, default=50)
+
+    memory = subparsers.add_parser("memory", help="peak memory of a one-user load and stream-mode save")
+    memory.add_argument("--users", type=int, nargs="+", default=[100, 500, 1000])
+    memory.add_argument("--transactions-per-user", type=int, default=100)
+
+    stress = subparsers.add_parser("stress", help="concurrent saves, loads and compactions")
+    stress.add_argument("--users", type=int, default=8)
+    stress.add_argument("--readers", type=int, default=8)
+    stress.add_argument("--seconds", type=float, default=5.0)
+
+    ann = subparsers.add_parser("ann", help="recall and latency of the FAISS index types")
+    ann.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ann.add_argument("--dim", type=int, default=384)
+    ann.add_argument("--queries", type=int, default=200)
+    ann.add_argument("-k", type=int, default=10)
+
+    startup = subparsers.add_parser("startup", help="cold import and login page render time")
+    startup.add_argument("--samples", type=int, default=3)
+
+    prompt_size = subparsers.add_parser("prompt_size", help="analytics prompt context size, raw vs. summarized")
+    prompt_size.add_argument("--transactions", type=int, nargs="+", default=[50, 500, 5000])
+    prompt_size.add_argument("--assets", type=int, default=50)
+    prompt_size.add_argument("--budget", type=int, default=prompt_context.PROMPT_TOKEN_BUDGET)
+
+    frames = subparsers.add_parser("analytics_frames", help="analytics frame and aggregate build time per asset count")
+    frames.add_argument("--assets", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    frames.add_argument("--samples", type=int, default=3)
+
+    aggs = subparsers.add_parser("aggregates", help="per-user aggregates: full rebuild vs. one incremental update")
+    aggs.add_argument("--transactions", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+
+    e2e = subparsers.add_parser("e2e", help="page latency with the offline fake LLM and embedder")
+    e2e.add_argument("--iterations", type=int, default=5)
+    e2e.add_argument("--users", type=int, default=20)
+    e2e.add_argument("--transactions-per-user", type=int, default=30)
+    e2e.add_argument("--latency", default="lognormal:0.8,0.4", help='e.g. "fixed:0.8", "uniform:0.3,1.5"')
+    e2e.add_argument("--tokens-per-second", type=float, default=60.0)
+    e2e.add_argument("--error-rate", type=float, default=0.0)
+    e2e.add_argument("--no-index", action="store_true", help="skip building the vector indexes")
+
+    args = parser.parse_args()
+    if args.benchmark == "user_load":
+        bench_user_load(args.users, args.transactions_per_user)
+    elif args.benchmark == "memory":
+        bench_memory(args.users, args.transactions_per_user)
+    elif args.benchmark == "stress":
+        stress_saves_and_loads(num_users=args.users, readers=args.readers, seconds=args.seconds)
+    elif args.benchmark == "ann":
+        bench_ann(args.sizes, args.dim, args.queries, args.k)
+    elif args.benchmark == "startup":
+        bench_startup(samples=args.samples)
+    elif args.benchmark == "prompt_size":
+        bench_prompt_size(args.transactions, args.assets, args.budget)
+    elif args.benchmark == "analytics_frames":
+        bench_analytics_frames(args.assets, args.samples)
+    elif args.benchmark == "aggregates":
+        bench_aggregates(args.transactions)
+    elif args.benchmark == "e2e":
+        bench_e2e(args.iterations, args.users, args.transactions_per_user, args.latency,
+                  args.tokens_per_second, args.error_rate, not args.no_index)
@@ -0,0 +1,246 @@
+# backend/change_log.py
+#
+# Append-only change log that sits next to the JSON snapshot. Each save
+# appends its put/delete entries as one JSON array per line instead of
+# rewriting the whole dataset; concurrent saves are group-committed with a
+# single fsync. A background compactor folds the log back into the snapshot,
+# and readers merge snapshot + log tail. Entries are idempotent, so replaying
+# one that is already folded into the snapshot is harmless.
+#
+# Versioning: the snapshot carries a "_generation" number and the log starts
+# with a {"generation": n} header naming the snapshot it applies on top of.
+# Compaction publishes the new snapshot (n + 1) before the emptied log, both
+# by atomic rename, so a reader that reads the log first and the snapshot
+# second always sees every committed save.
+
+import json
+import os
+import threading
+import time
+from .atomic_io import atomic_write_json, atomic_write_lines, file_lock
+
+ID_KEYS = {
+    "transactions": "transaction_id",
+    "financial_assets": "asset_id",
+    "investment_strategies": "strategy_id",
+    "offers": "offer_id"
+}
+
+COMPACT_INTERVAL_SECONDS = 30
+COMPACT_LOG_BYTES = 1024 * 1024
+GENERATION_KEY = "_generation"
+
+def log_path_for(data_path):
+    return os.path.splitext(data_path)[0] + ".log"
+
+def record_key(record, section):
+    """Identity of a record: its id field, or its content when it has none."""
+    key = record.get(ID_KEYS.get(section, "id"))
+    return key if key is not None else json.dumps(record, sort_keys=True)
+
+def diff_entries(section, user_id, old_records, new_records):
+    """Entries that turn old_records into new_records for one user."""
+    old = {record_key(r, section): r for r in old_records}
+    new = {record_key(r, section): r for r in new_records}
+    entries = []
+    for key in old:
+        if key not in new:
+            entries.append({"op": "delete", "section": section, "user_id": user_id, "id": key})
+    for key, record in new.items():
+        if old.get(key) != record:
+            entries.append({"op": "put", "section": section, "user_id": user_id, "id": key,
+                            "record": record})
+    return entries
+
+def apply_entries(records, entries, section):
+    """Replay log entries for one section on top of snapshot records."""
+    merged = {record_key(r, section): r for r in records}
+    for entry in entries:
+        if entry["op"] == "put":
+            merged[entry["id"]] = entry["record"]
+        else:
+            merged.pop(entry["id"], None)
+    return list(merged.values())
+
+def read_log(log_path):
+    """Return (generation, entries) for the log; generation 0 when it has no header."""
+    generation, entries, _, _ = read_log_from(log_path)
+    return generation or 0, entries
+
+def read_log_from(log_path, offset=0, file_id=None):
+    """Read the log from byte offset on: (generation, entries, end, file_id).
+
+    end is the offset after the last complete line and file_id identifies the
+    file, so passing both back reads only what was appended since. Returns
+    None when the log was replaced (e.g. compacted) since then. generation is
+    None unless the header was part of what was read.
+    """
+    generation = None
+    entries = []
+    try:
+        f = open(log_path, "rb")
+    except FileNotFoundError:
+        return None if offset else (generation, entries, 0, None)
+    with f:
+        stat = os.fstat(f.fileno())
+        current_id = (stat.st_dev, stat.st_ino)
+        if (file_id is not None and file_id != current_id) or stat.st_size < offset:
+            return None
+        f.seek(offset)
+        end = offset
+        for line in f:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError
+                item = json.loads(line)
+            except ValueError:
+                # A torn last line from an append in progress; skip the whole save
+                break
+            end += len(line)
+            if isinstance(item, dict):
+                generation = item.get("generation", generation)
+            else:
+                entries.extend(item)
+    return generation, entries, end, current_id
+
+def log_end(log_path):
+    """(offset, file_id) just past the last complete line, found without reading the whole log."""
+    try:
+        f = open(log_path, "rb")
+    except FileNotFoundError:
+        return 0, None
+    with f:
+        stat = os.fstat(f.fileno())
+        pos = stat.st_size
+        while pos > 0:
+            step = min(64 * 1024, pos)
+            f.seek(pos - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline >= 0:
+                return pos - step + newline + 1, (stat.st_dev, stat.st_ino)
+            pos -= step
+        return 0, (stat.st_dev, stat.st_ino)
+
+def read_entries(log_path):
+    return read_log(log_path)[1]
+
+class _GroupCommitWriter:
+    """Batches appends from concurrent callers into one write + fsync."""
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self._cond = threading.Condition()
+        self._pending = []
+        self._queued_seq = 0
+        self._done_seq = 0
+        self._busy = False
+        self._failed = {}
+        self.stats = {"appends": 0, "fsyncs": 0}
+
+    def append(self, entries):
+        # One line per save, so a reader sees all of it or none of it
+        line = json.dumps(entries) + "\n"
+        with self._cond:
+            self._pending.append(line)
+            self._queued_seq += 1
+            my_seq = self._queued_seq
+            self.stats["appends"] += 1
+            while self._done_seq < my_seq:
+                if self._busy:
+                    self._cond.wait()
+                    continue
+                # Become the leader: flush everything queued so far
+                self._busy = True
+                batch, first_seq, last_seq = self._pending, self._done_seq + 1, self._queued_seq
+                self._pending = []
+                self._cond.release()
+                try:
+                    self._write(batch)
+                    error = None
+                except OSError as e:
+                    error = e
+                finally:
+                    self._cond.acquire()
+                    self._busy = False
+                if error is not None:
+                    for seq in range(first_seq, last_seq + 1):
+                        self._failed[seq] = error
+                self._done_seq = last_seq
+                self._cond.notify_all()
+            error = self._failed.pop(my_seq, None)
+        if error is not None:
+            raise error
+
+    def _write(self, lines):
+        # The file lock keeps appends out of a compaction in this or another process
+        with file_lock(self.log_path):
+            with open(self.log_path, "a") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        self.stats["fsyncs"] += 1
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def _writer(log_path):
+    with _writers_lock:
+        if log_path not in _writers:
+            _writers[log_path] = _GroupCommitWriter(log_path)
+        return _writers[log_path]
+
+def append(entries, log_path):
+    """Durably append entries; returns once they are fsynced."""
+    if entries:
+        _writer(log_path).append(entries)
+
+def writer_stats(log_path):
+    return dict(_writer(log_path).stats)
+
+def compact(data_path, log_path=None):
+    """Fold the log into the JSON snapshot and start an empty log on top of it."""
+    log_path = log_path or log_path_for(data_path)
+    with file_lock(log_path):
+        log_generation, entries = read_log(log_path)
+        if not entries:
+            return 0
+        data = {}
+        if os.path.exists(data_path):
+            with open(data_path, "r") as f:
+                data = json.load(f)
+        by_section = {}
+        for entry in entries:
+            by_section.setdefault(entry["section"], []).append(entry)
+        for section, section_entries in by_section.items():
+            data[section] = apply_entries(data.get(section, []), section_entries, section)
+
+        generation = max(data.get(GENERATION_KEY, 0), log_generation) + 1
+        data[GENERATION_KEY] = generation
+        atomic_write_json(data_path, data, indent=2)
+        atomic_write_lines(log_path, [json.dumps({"generation": generation}) + "\n"])
+    return len(entries)
+
+_compactors = {}
+
+def start_compactor(data_path, interval=COMPACT_INTERVAL_SECONDS, max_log_bytes=COMPACT_LOG_BYTES,
+                    on_compact=None):
+    """Start (once per data file) a daemon thread that compacts oversized logs."""
+    with _writers_lock:
+        if data_path in _compactors:
+            return _compactors[data_path]
+        log_path = log_path_for(data_path)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if os.path.exists(log_path) and os.path.getsize(log_path) >= max_log_bytes:
+                        if compact(data_path, log_path) and on_compact is not None:
+                            on_compact()
+                except Exception as e:
+                    print(f"[!] Compaction of {log_path} failed: {e}")
+
+        thread = threading.Thread(target=run, name=f"compactor:{data_path}", daemon=True)
+        thread.start()
+        _compactors[data_path] = thread
+        return thread
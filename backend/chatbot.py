@@ -1,122 +1,115 @@
 
-import os
 import json
-import numpy as np
-from dotenv import load_dotenv
+import threading
+import time
+from collections import OrderedDict
 import streamlit as st
-from .data_manager import load_user_data
-from langchain_openai import AzureChatOpenAI
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationalRetrievalChain
-from langchain.prompts import PromptTemplate
-
-load_dotenv()
-
-# Azure OpenAI Configuration
-OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("AZURE_OPENAI_API_KEY environment variable is not set")
-OPENAI_DEPLOYMENT_ENDPOINT = "https://bfslabopenai.openai.azure.com/"
-DEPLOYMENT_NAME = "gpt-4o-mini"
-API_VERSION = "2023-05-15"
+from .data_manager import load_view_for_user
+from .change_log import record_key
+from . import search_index
+# Lazy singletons: the model and API client are created on first use, not on import
+from .llm import get_embedder
+from . import llm_metrics
 
 TOP_K = 5  # number of results to look at
+CANDIDATES_PER_RETRIEVER = 4 * TOP_K  # keyword / vector candidates fed into the fusion
+RRF_K = 60  # reciprocal rank fusion constant
+EMBEDDING_CACHE_SIZE = 1024  # query embeddings kept per process, least recently used evicted first
+EMBEDDING_CACHE_TTL_SECONDS = 3600
 
 # Initialize session state if not exists
 if 'current_user_email' not in st.session_state:
     st.session_state.current_user_email = None
 
-# Initialize LangChain components
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-llm = AzureChatOpenAI(
-    openai_api_version=API_VERSION,
-    azure_deployment=DEPLOYMENT_NAME,
-    azure_endpoint=OPENAI_DEPLOYMENT_ENDPOINT,
-    api_key=OPENAI_API_KEY,
-    temperature=0.7
-)
-
 # Load data
 def load_filtered_data():
-    data = load_user_data()
-    
-    # Filter transactions and assets for current user
+    # Transactions and assets of the current user only, from the shared cache.
+    # The view's tuples are passed on as is, so an unchanged section skips the index update
+    view = load_view_for_user(st.session_state.current_user_email) or {}
     filtered_data = {
-        "transactions": [tx for tx in data.get("transactions", []) 
-                        if tx.get("user_id") == st.session_state.current_user_email],
-        "financial_assets": [asset for asset in data.get("financial_assets", [])
-                           if asset.get("user_id") == st.session_state.current_user_email],
-        "investment_strategies": data.get("investment_strategies", [])
+        "transactions": view.get("transactions", ()),
+        "financial_assets": view.get("financial_assets", ()),
+        "investment_strategies": view.get("investment_strategies", ())
     }
     return filtered_data
 
+# Query embeddings shared by every session in the process: normalized text -> (time, vector)
+_embedding_cache = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+_embedding_cache_stats = {"hits": 0, "misses": 0}
+
+def _normalize_query(text):
+    # MiniLM is uncased, so case and spacing differences embed the same
+    return " ".join(text.lower().split())
+
+def embedding_cache_stats():
+    with _embedding_cache_lock:
+        return dict(_embedding_cache_stats, size=len(_embedding_cache))
+
 def get_embedding(text):
-    return embeddings.embed_query(text)
+    key = _normalize_query(text)
+    now = time.monotonic()
+    with _embedding_cache_lock:
+        cached = _embedding_cache.get(key)
+        if cached is not None and now - cached[0] < EMBEDDING_CACHE_TTL_SECONDS:
+            _embedding_cache.move_to_end(key)
+            _embedding_cache_stats["hits"] += 1
+            return list(cached[1])
+        _embedding_cache_stats["misses"] += 1
+
+    # Computed outside the lock so one slow forward pass doesn't block other sessions
+    vector = tuple(get_embedder().embed_query(key))
+    with _embedding_cache_lock:
+        _embedding_cache[key] = (now, vector)
+        _embedding_cache.move_to_end(key)
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+    return list(vector)
+
+def _fuse_rankings(rankings):
+    """Reciprocal rank fusion of several best-first lists of record keys."""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
 
 def search_all_categories(query):
+    # vector_store brings in faiss, so it loads with the first search rather than on import
+    from . import vector_store
+
     # Load filtered data every time a search is performed
     full_data = load_filtered_data()
     
     results_by_category = {}
-    query_embedding = get_embedding(query)
     current_user = st.session_state.current_user_email
+    # Only pay for the embedding when there is a FAISS index to use it with
+    query_embedding = get_embedding(query) if vector_store.available(full_data.keys()) else None
     
-    for category in full_data.keys():
-        data = full_data[category]
-        matches = []
-        
-        # Filter by user for both transactions and financial assets
-        if category in ["transactions", "financial_assets"]:
-            data = [item for item in data if item.get("user_id") == current_user]
-        
-        # Improved keyword matching
-        query_terms = query.lower().split()
-        
-        for item in data:
-            score = 0
-            max_score = 0
-            
-            # First check keywords field if it exists
-            if 'keywords' in item and isinstance(item['keywords'], list):
-                for term in query_terms:
-                    for keyword in item['keywords']:
-                        if term == keyword.lower():
-                            max_score = max(max_score, 3)  # Exact keyword match gets highest score
-                        elif term in keyword.lower():
-                            max_score = max(max_score, 2)  # Partial keyword match gets high score
-            
-            # Then check other fields
-            for term in query_terms:
-                term_score = 0
-                for key, value in item.items():
-                    if isinstance(value, str):
-                        # Exact match gets higher score
-                        if term == value.lower():
-                            term_score += 2
-                        # Partial match gets lower score
-                        elif term in value.lower():
-                            term_score += 1
-                    elif isinstance(value, dict):
-                        for k, v in value.items():
-                            if isinstance(v, str):
-                                if term == v.lower():
-                                    term_score += 2
-                                elif term in v.lower():
-                                    term_score += 1
-                
-                max_score = max(max_score, term_score)
-            
-            # If we found any matches, add the item with a normalized score
-            if max_score > 0:
-                # Normalize score between 0 and 1, where 1 is the best match
-                normalized_score = 1.0 / (1.0 + max_score)
-                matches.append((item, normalized_score))
-        
-        # Sort by score and take top K
-        matches.sort(key=lambda x: x[1])
-        results_by_category[category] = matches[:TOP_K]
+    for category, data in full_data.items():
+        items_by_key = {record_key(item, category): item for item in data}
+
+        # Keyword side: per-user categories get their own index; shared ones are indexed once
+        owner = current_user if category in ["transactions", "financial_assets"] else None
+        keyword_matches = search_index.search(
+            (category, owner), data, query, CANDIDATES_PER_RETRIEVER,
+            key_fn=lambda item, category=category: record_key(item, category)
+        )
+        rankings = [[record_key(item, category) for item, _ in keyword_matches]]
+
+        # Vector side: falls back to keyword-only when the index is missing
+        if query_embedding is not None:
+            # Per-user categories scan only the user's own partition of the index
+            vector_matches = vector_store.search(
+                category, query_embedding, CANDIDATES_PER_RETRIEVER,
+                allowed_ids=items_by_key if owner is not None else None,
+                user_id=owner
+            )
+            rankings.append([record_id for record_id, _ in vector_matches if record_id in items_by_key])
+
+        fused = _fuse_rankings(rankings)[:TOP_K]
+        # Lower is better (0..1), as callers expect
+        results_by_category[category] = [(items_by_key[key], 1.0 / (1.0 + score)) for key, score in fused]
 
     return results_by_category
 
@@ -171,22 +164,45 @@ Here are the relevant items from each category:\n"""
     prompt += "\nRemember to maintain a professional tone while being accessible, and always provide context for your recommendations."
     return prompt
 
-def generate_chat_response(user_query):
+def _chat_messages(user_query):
     results = search_all_categories(user_query)
     system_prompt = build_system_prompt(results)
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_query}
     ]
 
+def _error_reply(e):
+    return f"I apologize, but I encountered an error while processing your request. Please try again or rephrase your question. Error: {str(e)}"
+
+def format_reply(text):
+    # Format the response with markdown for better readability
+    return text.replace("\n\n", "\n").strip()
+
+def generate_chat_response(user_query):
+    messages = _chat_messages(user_query)
+
+    try:
+        response = llm_metrics.for_site("chat").invoke(messages)
+        return format_reply(response.content)
+    except Exception as e:
+        return _error_reply(e)
+
+def stream_chat_response(user_query):
+    """Yield the reply as text chunks as the LLM produces them (raw; see format_reply).
+
+    An error mid-stream ends the reply with the same apology generate_chat_response gives.
+    """
+    messages = _chat_messages(user_query)
+
     try:
-        response = llm.invoke(messages)
-        # Format the response with markdown for better readability
-        formatted_response = response.content.replace("\n\n", "\n").strip()
-        return formatted_response
+        for chunk in llm_metrics.for_site("chat").stream(messages):
+            if chunk.content:
+                yield chunk.content
     except Exception as e:
-        return f"I apologize, but I encountered an error while processing your request. Please try again or rephrase your question. Error: {str(e)}"
+        yield "\n\n" + _error_reply(e)
 
 # Export the functions for import
-__all__ = ['generate_chat_response', 'search_all_categories']
+__all__ = ['generate_chat_response', 'stream_chat_response', 'format_reply', 'search_all_categories',
+           'embedding_cache_stats']
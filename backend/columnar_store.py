@@ -0,0 +1,284 @@
+# backend/columnar_store.py
+
+import json
+import os
+import shutil
+import numpy as np
+from .change_log import GENERATION_KEY
+
+DATA_PATH = "data/large_financial_data.json"
+COLUMNAR_DIR = "data/columnar"
+MANIFEST_FILE = "manifest.json"
+
+# Per-user offset index, stored next to the columns of each user section:
+# sorted user ids plus the [start, stop) row range of each user
+INDEX_USERS_FILE = "_index_users.npy"
+INDEX_STARTS_FILE = "_index_starts.npy"
+INDEX_STOPS_FILE = "_index_stops.npy"
+
+# Sections whose rows belong to a single user
+USER_SECTIONS = ["transactions", "financial_assets"]
+
+# Column kinds: scalar columns keep their numpy dtype, everything else
+# (nested dicts, lists, missing keys, None) is stored as JSON text
+KIND_INT = "int"
+KIND_FLOAT = "float"
+KIND_BOOL = "bool"
+KIND_STR = "str"
+KIND_JSON = "json"
+
+# Text columns (str and JSON) are variable-length: the UTF-8 bytes of every
+# row back to back in <column>.npy, and the int64 [start, stop) byte offsets
+# of the rows in <column>.offsets.npy. Both stay plain, mmap-able arrays.
+TEXT_KINDS = (KIND_STR, KIND_JSON)
+OFFSETS_SUFFIX = ".offsets.npy"
+
+# Stores written in an older layout are never reported fresh
+FORMAT_VERSION = 2
+
+_MISSING = object()
+
+def _column_kind(values):
+    """Pick the narrowest column kind that round-trips every value."""
+    if all(isinstance(v, bool) for v in values):
+        return KIND_BOOL
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return KIND_INT
+    if all(isinstance(v, float) for v in values):
+        return KIND_FLOAT
+    if all(isinstance(v, str) for v in values):
+        return KIND_STR
+    return KIND_JSON
+
+def _to_array(values, kind):
+    if kind == KIND_BOOL:
+        return np.array(values, dtype=np.bool_)
+    if kind == KIND_INT:
+        return np.array(values, dtype=np.int64)
+    return np.array(values, dtype=np.float64)
+
+def _to_text(values, kind):
+    """(UTF-8 buffer, row offsets) of a str or JSON column."""
+    if kind == KIND_JSON:
+        # Missing keys are stored as "" so the reader can leave them out again
+        values = ["" if v is _MISSING else json.dumps(v) for v in values]
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def _write_section(section_dir, records):
+    os.makedirs(section_dir, exist_ok=True)
+    keys = []
+    for record in records:
+        for key in record:
+            if key not in keys:
+                keys.append(key)
+
+    columns = {}
+    for key in keys:
+        values = [record.get(key, _MISSING) for record in records]
+        kind = KIND_JSON if any(v is _MISSING for v in values) else _column_kind(values)
+        if kind in TEXT_KINDS:
+            buffer, offsets = _to_text(values, kind)
+            np.save(os.path.join(section_dir, f"{key}.npy"), buffer)
+            np.save(os.path.join(section_dir, f"{key}{OFFSETS_SUFFIX}"), offsets)
+        else:
+            np.save(os.path.join(section_dir, f"{key}.npy"), _to_array(values, kind))
+        columns[key] = kind
+    return columns
+
+def _cluster_by_user(records):
+    """Sort rows so each user's records are contiguous (rows without a user go last)."""
+    return sorted(records, key=lambda r: (r.get("user_id") is None, str(r.get("user_id"))))
+
+def _write_user_index(section_dir, records):
+    users, starts, stops = [], [], []
+    for i, record in enumerate(records):
+        user_id = record.get("user_id")
+        if user_id is None:
+            break
+        if users and users[-1] == str(user_id):
+            stops[-1] = i + 1
+        else:
+            users.append(str(user_id))
+            starts.append(i)
+            stops.append(i + 1)
+    np.save(os.path.join(section_dir, INDEX_USERS_FILE), np.array(users, dtype=np.str_))
+    np.save(os.path.join(section_dir, INDEX_STARTS_FILE), np.array(starts, dtype=np.int64))
+    np.save(os.path.join(section_dir, INDEX_STOPS_FILE), np.array(stops, dtype=np.int64))
+
+def convert_json_to_columnar(json_path=DATA_PATH, store_dir=COLUMNAR_DIR):
+    """One-shot conversion of the JSON dataset into per-column .npy files."""
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    stat = os.stat(json_path)
+
+    # Build next to the live store and swap it in once complete
+    tmp_dir = store_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "source_size": stat.st_size,
+        "generation": data.get(GENERATION_KEY, 0),
+        "sections": {}
+    }
+    for section, records in data.items():
+        if not isinstance(records, list):
+            continue
+        section_dir = os.path.join(tmp_dir, section)
+        indexed = section in USER_SECTIONS
+        if indexed:
+            records = _cluster_by_user(records)
+        manifest["sections"][section] = {
+            "rows": len(records),
+            "columns": _write_section(section_dir, records),
+            "user_index": indexed
+        }
+        if indexed:
+            _write_user_index(section_dir, records)
+
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = store_dir + ".old"
+    if os.path.exists(store_dir):
+        os.rename(store_dir, old_dir)
+    os.rename(tmp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+def store_dir_for(json_path):
+    """Columnar store directory that sits next to a JSON dataset."""
+    return os.path.join(os.path.dirname(json_path), "columnar")
+
+def load_manifest(store_dir=COLUMNAR_DIR):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def is_fresh(json_path=DATA_PATH, store_dir=COLUMNAR_DIR):
+    """True when the columnar store was built from the current JSON file."""
+    manifest = load_manifest(store_dir)
+    if manifest is None or manifest.get("format") != FORMAT_VERSION:
+        return False
+    try:
+        stat = os.stat(json_path)
+    except FileNotFoundError:
+        return False
+    return (manifest["source_mtime_ns"] == stat.st_mtime_ns
+            and manifest["source_size"] == stat.st_size)
+
+def user_row_range(section, user_id, store_dir=COLUMNAR_DIR):
+    """Return the [start, stop) rows of user_id in a clustered section.
+
+    A binary search over the memory-mapped index, so the cost does not grow
+    with the number of users or rows in the store.
+    """
+    section_dir = os.path.join(store_dir, section)
+    users = np.load(os.path.join(section_dir, INDEX_USERS_FILE), mmap_mode="r")
+    pos = int(np.searchsorted(users, str(user_id)))
+    if pos == len(users) or users[pos] != str(user_id):
+        return 0, 0
+    starts = np.load(os.path.join(section_dir, INDEX_STARTS_FILE), mmap_mode="r")
+    stops = np.load(os.path.join(section_dir, INDEX_STOPS_FILE), mmap_mode="r")
+    return int(starts[pos]), int(stops[pos])
+
+def _read_text(section_dir, column, rows=None):
+    """Rows of a text column as a list of str; rows is a slice or an index array."""
+    buffer = np.load(os.path.join(section_dir, f"{column}.npy"), mmap_mode="r")
+    offsets = np.load(os.path.join(section_dir, f"{column}{OFFSETS_SUFFIX}"), mmap_mode="r")
+    if rows is None:
+        rows = slice(0, len(offsets) - 1)
+    if isinstance(rows, slice):
+        # A contiguous row range is one contiguous byte range
+        start, stop, _ = rows.indices(len(offsets) - 1)
+        if stop <= start:
+            return []
+        bounds = np.asarray(offsets[start:stop + 1]) - offsets[start]
+        raw = buffer[offsets[start]:offsets[stop]].tobytes()
+        return [raw[a:b].decode("utf-8") for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+    return [buffer[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8") for i in rows]
+
+def _user_rows(section_dir, user_id, kind):
+    if kind in TEXT_KINDS:
+        key = json.dumps(user_id) if kind == KIND_JSON else user_id
+        return np.flatnonzero(np.array(_read_text(section_dir, "user_id"), dtype=object) == key)
+    user_ids = np.load(os.path.join(section_dir, "user_id.npy"), mmap_mode="r")
+    return np.flatnonzero(user_ids == user_id)
+
+def read_columns(section, columns=None, user_id=None, store_dir=COLUMNAR_DIR, manifest=None):
+    """Return {column: values} for a section, loading only the requested columns.
+
+    Scalar columns come back as memory-mapped arrays, so untouched rows and
+    columns are never read from disk. Text columns come back as lists of str
+    (JSON columns as raw text; use read_records to decode).
+    """
+    manifest = manifest or load_manifest(store_dir)
+    if manifest is None or section not in manifest["sections"]:
+        return {}
+    section_dir = os.path.join(store_dir, section)
+    available = manifest["sections"][section]["columns"]
+    columns = [c for c in (columns or available) if c in available]
+
+    rows = None
+    if user_id is not None and "user_id" in available:
+        if manifest["sections"][section].get("user_index"):
+            rows = slice(*user_row_range(section, user_id, store_dir))
+        else:
+            rows = _user_rows(section_dir, user_id, available["user_id"])
+
+    result = {}
+    for column in columns:
+        if available[column] in TEXT_KINDS:
+            result[column] = _read_text(section_dir, column, rows)
+            continue
+        array = np.load(os.path.join(section_dir, f"{column}.npy"), mmap_mode="r")
+        result[column] = array if rows is None else array[rows]
+    return result
+
+def read_records(section, columns=None, user_id=None, store_dir=COLUMNAR_DIR, manifest=None):
+    """Rebuild record dicts for a section from the requested columns."""
+    manifest = manifest or load_manifest(store_dir)
+    arrays = read_columns(section, columns, user_id, store_dir, manifest)
+    if not arrays:
+        return []
+    kinds = manifest["sections"][section]["columns"]
+
+    decoded = {}
+    for column, array in arrays.items():
+        if kinds[column] == KIND_JSON:
+            decoded[column] = [json.loads(v) if v else _MISSING for v in array]
+        elif kinds[column] == KIND_STR:
+            decoded[column] = array
+        else:
+            decoded[column] = array.tolist()
+
+    n_rows = len(next(iter(decoded.values())))
+    records = []
+    for i in range(n_rows):
+        record = {}
+        for column, values in decoded.items():
+            if values[i] is not _MISSING:
+                record[column] = values[i]
+        records.append(record)
+    return records
+
+def load_user_records(user_id, store_dir=COLUMNAR_DIR):
+    """Return every section, with user-owned sections narrowed to user_id."""
+    manifest = load_manifest(store_dir)
+    data = {}
+    for section in manifest["sections"]:
+        scope = user_id if section in USER_SECTIONS else None
+        data[section] = read_records(section, user_id=scope, store_dir=store_dir, manifest=manifest)
+    return data
+
+if __name__ == "__main__":
+    manifest = convert_json_to_columnar()
+    for section, info in manifest["sections"].items():
+        print(f"- {section}: {info['rows']} rows, {len(info['columns'])} columns")
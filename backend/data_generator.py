@@ -4,6 +4,10 @@ import uuid
 from datetime import datetime, timedelta
 import numpy as np
 from faker import Faker
+try:
+    from .normalize import normalize_asset
+except ImportError:  # run as a script: python backend/data_generator.py
+    from normalize import normalize_asset
 
 fake = Faker()
 
@@ -85,7 +89,7 @@ def generate_financial_asset(user_id=None):
     asset_types = ["mutual_fund", "FD", "bond", "equity", "ETF"]
     asset_type = random.choice(asset_types)
     
-    return {
+    return normalize_asset({
         "asset_id": str(uuid.uuid4()),
         "user_id": user_id,  # Added user_id field
         "type": asset_type,
@@ -120,7 +124,7 @@ def generate_financial_asset(user_id=None):
         "expiry_date": "",
         "compatible_user_profiles": random.sample(["investors", "retirees", "young_professionals", "risk_averse"], k=random.randint(1, 3)),
         "prerequisites": random.sample(["Demat account", "KYC", "Bank account"], k=random.randint(1, 2))
-    }
+    })
 
 def generate_investment_strategy():
     return {
@@ -3,58 +3,240 @@
 import streamlit as st
 import json
 import os
-import pandas as pd
+import threading
+from . import aggregates, change_log, columnar_store, dataset_cache, json_stream, normalize
 
 DATA_PATH = "data/large_financial_data.json"
 
+# "cache" keeps one parsed copy per process; "stream" re-reads the file on
+# every load but only ever holds the current user's rows in memory
+LOAD_MODE = os.getenv("FINPILOT_LOAD_MODE", "cache")
+
+# Same switch as sql_store.is_enabled; sql_store (and SQLAlchemy with it) is
+# only imported when it is on, like in backend/auth.py
+def _sql_enabled():
+    return os.getenv("FINPILOT_STORAGE", "json").lower() == "sqlite"
+
+def stream_records_for_user(user_id, data_path=DATA_PATH):
+    """Bounded-memory load: filter the snapshot by user while parsing, then apply the log."""
+    # Log before snapshot, the same ordering dataset_cache relies on
+    _, entries = change_log.read_log(change_log.log_path_for(data_path))
+    if not os.path.exists(data_path) and not entries:
+        return None
+    data = {}
+    if os.path.exists(data_path):
+        data = json_stream.load_filtered(data_path, user_id, columnar_store.USER_SECTIONS)
+    by_section = {}
+    for entry in entries:
+        if user_id is None or entry["section"] not in columnar_store.USER_SECTIONS or entry["user_id"] == user_id:
+            by_section.setdefault(entry["section"], []).append(entry)
+    for section, section_entries in by_section.items():
+        data[section] = change_log.apply_entries(data.get(section, []), section_entries, section)
+    return data
+
+def _shares_records(user_id):
+    # Only the cache mode hands out records that other sessions also hold
+    return not (_sql_enabled() and user_id) and LOAD_MODE != "stream"
+
+def load_records_for_user(user_id, data_path=DATA_PATH):
+    """All sections narrowed to user_id from the configured backend, or None without data.
+
+    Sections are fresh lists, but in cache mode the record dicts in them are
+    shared with every session and must not be modified; load_user_data
+    returns records the caller owns.
+    """
+    if _sql_enabled() and user_id:
+        from . import sql_store
+        return sql_store.load_user_data(user_id)
+    if LOAD_MODE == "stream":
+        return stream_records_for_user(user_id, data_path)
+    # Shared, process-wide parse of the dataset narrowed to the current user
+    view = dataset_cache.get_user_view(user_id, data_path)
+    return {section: list(rows) for section, rows in view.items()} if view is not None else None
+
+def load_view_for_user(user_id, data_path=DATA_PATH):
+    """Like load_records_for_user, but in cache mode the shared read-only view itself.
+
+    Its sections are tuples that stay the same objects until the user's data
+    changes, so callers can skip work on an identity check (see
+    search_index.get_index). Other modes return fresh lists on every call.
+    """
+    if _shares_records(user_id):
+        return dataset_cache.get_user_view(user_id, data_path)
+    return load_records_for_user(user_id, data_path)
+
 def load_user_data():
-    if not os.path.exists(DATA_PATH):
+    """The current user's records, as lists of record dicts the caller may modify.
+
+    In cache mode each record is a copy of the shared one; nested values
+    (location, metadata, ...) are still shared, so replace them rather than
+    editing them in place.
+    """
+    user_id = st.session_state.get("current_user_email")
+    data = load_records_for_user(user_id)
+    if data is None:
         return {"transactions": [], "financial_assets": []}
-    with open(DATA_PATH, "r") as f:
-        data = json.load(f)
-        # Filter transactions and assets for current user
-        if 'current_user_email' in st.session_state and st.session_state.current_user_email:
-            data["transactions"] = [tx for tx in data.get("transactions", []) 
-                                  if tx.get("user_id") == st.session_state.current_user_email]
-            data["financial_assets"] = [asset for asset in data.get("financial_assets", [])
-                                      if asset.get("user_id") == st.session_state.current_user_email]
+    if _shares_records(user_id):
+        data = {section: [dict(r) if isinstance(r, dict) else r for r in rows] for section, rows in data.items()}
     return data
 
+def _snapshot_source(data_path):
+    # Saves only append to the log; a new snapshot (compaction, backfill) means a rebuild
+    try:
+        stat = os.stat(data_path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+
+def _aggregate_store(user_id, data_path=DATA_PATH):
+    """(store key, source, log path) for the user's aggregates.
+
+    source changes when the storage is replaced. The log path is None when
+    there is no change log to follow (SQL).
+    """
+    if _sql_enabled() and user_id:
+        from . import sql_store
+        return sql_store.DATABASE_URL, None, None
+    return data_path, _snapshot_source(data_path), change_log.log_path_for(data_path)
+
+def _log_position_after(user_id, log_path, position, own_entries=()):
+    """The log position past everything appended since position, or None if the user's
+    aggregates cannot follow: the log was replaced, or it holds entries for user_id
+    other than own_entries (i.e. written by another process).
+    """
+    tail = change_log.read_log_from(log_path, *position)
+    if tail is None:
+        return None
+    _, entries, end, file_id = tail
+    own = list(own_entries)
+    for entry in entries:
+        if entry.get("user_id") != user_id or entry["section"] not in columnar_store.USER_SECTIONS:
+            continue
+        if entry not in own:
+            return None
+        own.remove(entry)
+    return end, file_id
+
+def load_aggregates_for_user(user_id, data_path=DATA_PATH):
+    """Materialized aggregates of the user's records (see backend/aggregates.py).
+
+    Built with one pass over the records on first use, then kept current by
+    the save and delete functions below. Each read also follows the change
+    log from where the aggregates are current up to, so entries for the user
+    appended by another process trigger a rebuild.
+    """
+    store_key, source, log_path = _aggregate_store(user_id, data_path)
+    # Under the user's save lock, so no save lands between the checks and the put
+    with _user_lock(user_id):
+        cached = aggregates.get(store_key, user_id, source)
+        if cached is not None:
+            aggs, position = cached
+            if log_path is None:
+                return aggs
+            position = _log_position_after(user_id, log_path, position)
+            if position is not None:
+                aggregates.update(store_key, user_id, source, [], position)
+                return aggs
+        # Position before the load: entries appended meanwhile are looked at again next time
+        position = change_log.log_end(log_path) if log_path else None
+        aggs = aggregates.build(load_records_for_user(user_id, data_path) or {})
+        aggregates.put(store_key, user_id, source, aggs, position)
+        return aggs
+
+def _rebuild_columnar_store():
+    # Keep the columnar copy in step with the snapshot it was built from
+    if columnar_store.load_manifest() is not None:
+        columnar_store.convert_json_to_columnar(DATA_PATH)
+
+_user_locks = {}
+_user_locks_guard = threading.Lock()
+
+def _user_lock(user_id):
+    with _user_locks_guard:
+        if user_id not in _user_locks:
+            _user_locks[user_id] = threading.Lock()
+        return _user_locks[user_id]
+
+def save_records_for_user(user_id, data, data_path=DATA_PATH):
+    # Saves of the same user are serialized so each diff is taken against the
+    # latest committed version; different users still share group commits
+    data = normalize.normalize_data(data)
+    with _user_lock(user_id):
+        # Log only what changed for this user; sections not passed in are left alone.
+        # The diff base comes from the configured loader, so stream mode stays bounded
+        current = load_records_for_user(user_id, data_path) or {}
+        # Diffed in normalized form: records not backfilled yet would otherwise
+        # all differ from their normalized copies and be logged on every save
+        base = normalize.normalize_data(current)
+        entries = []
+        for section in columnar_store.USER_SECTIONS:
+            if section in data:
+                entries.extend(change_log.diff_entries(section, user_id, base.get(section, ()), data[section]))
+
+        log_path = change_log.log_path_for(data_path)
+        change_log.append(entries, log_path)
+        dataset_cache.bump_write_version()
+        source = _snapshot_source(data_path)
+        cached = aggregates.get(data_path, user_id, source) if entries else None
+        if cached is not None:
+            # Fold in this save, unless someone else also wrote the user since the aggregates were current
+            position = _log_position_after(user_id, log_path, cached[1], entries)
+            if position is None:
+                aggregates.drop(data_path, user_id)
+            else:
+                aggregates.update(data_path, user_id, source,
+                                  aggregates.changes_from_entries(entries, current), position)
+
 def save_user_data(data):
-    # Load all data first
-    all_data = {}
-    if os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "r") as f:
-            all_data = json.load(f)
-    
-    # Update transactions for current user
-    if st.session_state.current_user_email:
-        # Remove old transactions for this user
-        all_data["transactions"] = [tx for tx in all_data.get("transactions", [])
-                                  if tx.get("user_id") != st.session_state.current_user_email]
-        # Add new transactions
-        all_data["transactions"].extend(data.get("transactions", []))
-    
-    with open(DATA_PATH, "w") as f:
-        json.dump(all_data, f, indent=2)
+    user_id = st.session_state.current_user_email
+    if not user_id:
+        return
+    if _sql_enabled():
+        from . import sql_store
+        with _user_lock(user_id):
+            entries, current = sql_store.save_user_records(user_id, data)
+            aggregates.update(sql_store.DATABASE_URL, user_id, None,
+                              aggregates.changes_from_entries(entries, current))
+        return
+    save_records_for_user(user_id, data)
+    change_log.start_compactor(DATA_PATH, on_compact=_rebuild_columnar_store)
 
 def export_data_as_json(data):
     json_str = json.dumps(data, indent=2)
     st.download_button("⬇️ Export Data as JSON", json_str, file_name="user_data_export.json")
 
+def _delete_from_sql(section, records, delete):
+    # SQL deletes are immediate, so the aggregates follow now rather than on the next save
+    from . import sql_store
+    user_id = st.session_state.current_user_email
+    with _user_lock(user_id):
+        delete(user_id)
+        aggregates.update(sql_store.DATABASE_URL, user_id, None, [(section, r, None) for r in records])
+
 def delete_transaction_by_id(data, tx_id):
     txs = data.get("transactions", [])
+    if _sql_enabled():
+        from . import sql_store
+        _delete_from_sql("transactions", [t for t in txs if t.get("transaction_id") == tx_id],
+                         lambda user_id: sql_store.delete_transaction(user_id, tx_id))
     updated = [t for t in txs if t.get("transaction_id") != tx_id]
     data["transactions"] = updated
     return data
 
 def delete_asset_by_id(data, asset_id):
     assets = data.get("financial_assets", [])
+    if _sql_enabled():
+        from . import sql_store
+        _delete_from_sql("financial_assets", [a for a in assets if a.get("asset_id") == asset_id],
+                         lambda user_id: sql_store.delete_asset(user_id, asset_id))
     updated = [a for a in assets if a.get("asset_id") != asset_id]
     data["financial_assets"] = updated
     return data
 
 def show_data_dashboard():
+    # Only the dashboard builds frames, so pandas loads when it is first shown
+    import pandas as pd
+
     st.header("📁 Your Data Records")
     data = load_user_data()
 
@@ -0,0 +1,184 @@
+# backend/dataset_cache.py
+#
+# One parsed copy of the dataset per process, shared by every Streamlit
+# session. Loaders get read-only per-user views: sections are tuples and the
+# record dicts are shared between sessions, so callers must not mutate them.
+# Views are the JSON snapshot (or its columnar copy) merged with the tail of
+# the change log.
+#
+# Each view is an immutable snapshot of one version of the data: a reader
+# keeps using the view it got while writers publish newer versions. Cached
+# views are served without taking the lock. A save only re-reads the part of
+# the log appended since the last read and only drops the views of the users
+# it touched, so a writer fetching its diff base usually gets a cached view.
+# Building a view is serialized, though: the first load after a new snapshot
+# lands waits for that snapshot to be parsed, writers included.
+
+import json
+import os
+import threading
+from types import MappingProxyType
+from . import change_log, columnar_store
+
+DATA_PATH = "data/large_financial_data.json"
+
+_lock = threading.Lock()  # serializes refreshes and view builds
+_version_lock = threading.Lock()
+_write_version = 0
+_cache_key = None
+_dataset = None  # {section: tuple(records)} for the whole file
+_by_user = None  # {section: {user_id: tuple(records)}} for USER_SECTIONS
+_snapshot_generation = 0
+_log = None      # the change log read so far: generation, grouped entries, end offset, file id
+_views = {}      # user_id -> read-only view, valid for _cache_key
+_stats = {"hits": 0, "misses": 0, "parses": 0, "log_reads": 0}
+
+def bump_write_version():
+    """Make the next load look for new data; called by writers after they publish data."""
+    global _write_version
+    with _version_lock:
+        _write_version += 1
+
+def cache_stats():
+    with _lock:
+        return dict(_stats, write_version=_write_version, cached_views=len(_views))
+
+def _file_key(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+
+def _current_key(path):
+    with _version_lock:
+        version = _write_version
+    return (path, _file_key(path), _file_key(change_log.log_path_for(path)), version)
+
+def _group_entries(grouped, entries):
+    for entry in entries:
+        grouped.setdefault(entry["section"], {}).setdefault(entry.get("user_id"), []).append(entry)
+
+def _read_log(path):
+    """Bring _log up to date; returns the entries it had not seen, or None if it was re-read."""
+    global _log
+    log_path = change_log.log_path_for(path)
+    _stats["log_reads"] += 1
+    if _log is not None:
+        tail = change_log.read_log_from(log_path, _log["end"], _log["file_id"])
+        if tail is not None:
+            _, entries, _log["end"], _log["file_id"] = tail
+            _group_entries(_log["grouped"], entries)
+            return entries
+    generation, entries, end, file_id = change_log.read_log_from(log_path)
+    _log = {"generation": generation or 0, "grouped": {}, "end": end, "file_id": file_id}
+    _group_entries(_log["grouped"], entries)
+    return None
+
+def _merge_log(view, user_id):
+    """Replay the log entries that concern user_id on top of a snapshot view."""
+    merged = dict(view)
+    for section, by_user in _log["grouped"].items():
+        if user_id is not None and section in columnar_store.USER_SECTIONS:
+            entries = by_user.get(user_id, [])
+        else:
+            entries = [entry for user_entries in by_user.values() for entry in user_entries]
+        if entries:
+            merged[section] = tuple(change_log.apply_entries(merged.get(section, ()), entries, section))
+    return merged
+
+def _parse_json(path):
+    global _dataset, _by_user, _snapshot_generation
+    with open(path, "r") as f:
+        data = json.load(f)
+    dataset = {}
+    by_user = {}
+    for section, records in data.items():
+        if not isinstance(records, list):
+            continue
+        dataset[section] = tuple(records)
+        if section in columnar_store.USER_SECTIONS:
+            groups = {}
+            for record in records:
+                groups.setdefault(record.get("user_id"), []).append(record)
+            by_user[section] = {user_id: tuple(rows) for user_id, rows in groups.items()}
+    _dataset, _by_user = dataset, by_user
+    _snapshot_generation = data.get(change_log.GENERATION_KEY, 0)
+    _stats["parses"] += 1
+
+def _build_snapshot_view(user_id, path):
+    log_generation = _log["generation"]
+    # The columnar store can serve a single user without parsing the whole file
+    store_dir = columnar_store.store_dir_for(path)
+    if user_id is not None and _dataset is None and columnar_store.is_fresh(path, store_dir):
+        manifest = columnar_store.load_manifest(store_dir)
+        if manifest.get("generation", 0) >= log_generation:
+            records = columnar_store.load_user_records(user_id, store_dir)
+            return {section: tuple(rows) for section, rows in records.items()}
+    if not os.path.exists(path):
+        return None
+    # A snapshot older than the log means a compaction landed since we parsed it
+    if _dataset is None or _snapshot_generation < log_generation:
+        _parse_json(path)
+    if user_id is None:
+        return dict(_dataset)
+    return {
+        section: _by_user[section].get(user_id, ()) if section in _by_user else rows
+        for section, rows in _dataset.items()
+    }
+
+def _build_view(user_id, path):
+    view = _build_snapshot_view(user_id, path)
+    if view is None and not _log["grouped"]:
+        return None
+    return _merge_log(view or {}, user_id)
+
+def _refresh(path):
+    """Drop the views that the data on disk has moved past; call with _lock held."""
+    global _cache_key, _dataset, _by_user, _log
+    key = _current_key(path)
+    if key == _cache_key:
+        return
+    if _cache_key is None or key[:2] != _cache_key[:2]:
+        # A new snapshot: drop it and re-read the log. The log is read before
+        # the snapshot is parsed, and compaction publishes the snapshot first,
+        # so this order can never pair an emptied log with an old snapshot.
+        _dataset = None
+        _by_user = None
+        _log = None
+    new_entries = _read_log(path)
+    if new_entries is None:
+        _views.clear()
+    for entry in new_entries or ():
+        if entry["section"] not in columnar_store.USER_SECTIONS:
+            _views.clear()
+            break
+        _views.pop(entry.get("user_id"), None)
+        _views.pop(None, None)
+    # Published last, so a lock-free reader that sees the new key sees the dropped views too
+    _cache_key = key
+
+def get_user_view(user_id, path=DATA_PATH):
+    """Return a read-only {section: tuple(records)} view for user_id.
+
+    User-owned sections are narrowed to user_id; with no user the whole
+    dataset is returned. Returns None when there is no data on disk.
+    """
+    # Views are never modified once published, so a hit needs no lock
+    # (the counters are approximate under contention)
+    if _current_key(path) == _cache_key:
+        view = _views.get(user_id)
+        if view is not None:
+            _stats["hits"] += 1
+            return view
+    with _lock:
+        _refresh(path)
+        if user_id in _views:
+            _stats["hits"] += 1
+            return _views[user_id]
+        _stats["misses"] += 1
+        view = _build_view(user_id, path)
+        if view is not None:
+            view = MappingProxyType(view)
+            _views[user_id] = view
+        return view
@@ -1,25 +1,62 @@
+# backend/embeddings.py
+#
+# Embedding + FAISS index library. Importing it is cheap: the model is loaded
+# on first use, and indexes are only built when asked to. Build from the
+# repository root with:
+#   python -m backend.embeddings build
+# and try a query with:
+#   python -m backend.embeddings search transactions "electronics in Delhi"
 
+import argparse
 import os
 import json
+import time
+import hashlib
+import threading
 import faiss
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from . import vector_store
+from .columnar_store import USER_SECTIONS
+from .json_stream import iter_records
+from .vector_store import INDEX_DIR, INDEX_TYPES, build_index, save_user_partitions
 
-# Initialize embeddings
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+#1. Model, loaded lazily once per process (worker processes load their own)
+MODEL_NAME = "all-MiniLM-L6-v2"
+_model = None
+_model_lock = threading.Lock()
+
+def model_name():
+    # "huggingface" (default) or "fake", the offline stand-in from backend/fake_llm.py
+    if os.getenv("FINPILOT_EMBEDDING_PROVIDER", "huggingface") == "fake":
+        return "fake-embeddings"
+    return MODEL_NAME
+
+def get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            if model_name() == "fake-embeddings":
+                from .fake_llm import FakeEmbeddings
+                _model = FakeEmbeddings()
+            else:
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+                _model = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+        return _model
 
 #2. Paths
 DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "large_financial_data.json")
-INDEX_DIR = "faiss_multi_output"
-META_DIR = os.path.join(INDEX_DIR, "metadata")
-os.makedirs(META_DIR, exist_ok=True)
 
-#3. Load dataset
-with open(DATA_PATH, "r", encoding="utf-8") as f:
-    data = json.load(f)
+# Build settings: texts per embed_documents call, and worker processes per section.
+# Each worker loads its own model and splits the cores with the others, so a
+# few workers go a long way; more mostly costs memory.
+EMBED_BATCH_SIZE = int(os.getenv("FINPILOT_EMBED_BATCH_SIZE", "256"))
+NUM_WORKERS = int(os.getenv("FINPILOT_EMBED_WORKERS", str(min(2, os.cpu_count() or 1))))
+# flat (exact), ivf_flat, hnsw or ivf_pq; see backend/vector_store.py
+INDEX_TYPE = os.getenv("FINPILOT_INDEX_TYPE", "flat")
 
-#4. Formatting functions
+#3. Formatting functions
 def format_transaction(t):
     return f"{t['merchant_name']} | {t['category']} | {t['amount']} {t['currency']} | {t['payment_method']} | {t['location']['city']}, {t['location']['country']} | tags: {', '.join(t.get('tags', []))}"
 
@@ -32,65 +69,300 @@ def format_asset(a):
 def format_strategy(s):
     return f"{s['name']} | Risk: {s['risk_profile']} | Return Target: {s['target_annual_return']}% | Allocation: {s['allocation_blueprint']}"
 
+#4. Stream the dataset, keeping only each record's formatted text, id and owner
+SECTIONS = {
+    "transactions": (format_transaction, "transaction_id"),
+    "offers": (format_offer, "offer_id"),
+    "financial_assets": (format_asset, "asset_id"),
+    "investment_strategies": (format_strategy, "strategy_id")
+}
+
+def load_section_texts(path=DATA_PATH):
+    """Single streaming pass over the dataset: {section: (texts, ids, owners)}.
+
+    owners holds each record's user_id for per-user sections and is None otherwise.
+    """
+    section_texts = {name: ([], [], [] if name in USER_SECTIONS else None) for name in SECTIONS}
+    for section, record in iter_records(path, sections=SECTIONS):
+        formatter, id_key = SECTIONS[section]
+        texts, ids, owners = section_texts[section]
+        texts.append(formatter(record))
+        ids.append(record[id_key])
+        if owners is not None:
+            owners.append(record.get("user_id") or "")
+    return section_texts
+
 #5. Embedding function
 def get_embedding(text):
-    return embeddings.embed_query(text)
+    return get_model().embed_query(text)
 
-#6. Build + Save FAISS index
-def process_and_index(items, formatter, identifier_key, output_prefix):
-    print(f"\n[*] Processing {output_prefix}...")
+def embed_batches(texts, batch_size=EMBED_BATCH_SIZE, progress=False):
+    """Embed texts with one embed_documents call per batch; returns a float32 matrix."""
+    batches = range(0, len(texts), batch_size)
+    vectors = []
+    for start in (tqdm(batches) if progress else batches):
+        vectors.extend(get_model().embed_documents(texts[start:start + batch_size]))
+    return np.array(vectors, dtype="float32")
+
+def _init_worker(num_threads):
+    # Without this every worker's torch would use all cores, oversubscribing them N x N
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(num_threads)
 
-    texts = [formatter(item) for item in items]
-    metadata = [item[identifier_key] for item in items]
+def _embed_shard(texts, shard_path, batch_size):
+    # Runs in a worker process, which loads its own copy of the model on first use
+    np.save(shard_path, embed_batches(texts, batch_size))
+    return shard_path
 
-    embeddings_list = [get_embedding(text) for text in tqdm(texts)]
-    matrix = np.array(embeddings_list).astype("float32")
+def embed_sharded(texts, output_prefix, num_workers=NUM_WORKERS, batch_size=EMBED_BATCH_SIZE,
+                  index_dir=INDEX_DIR):
+    """Split texts into contiguous shards embedded in parallel, then merge them in order."""
+    if num_workers <= 1 or len(texts) <= batch_size:
+        return embed_batches(texts, batch_size, progress=True)
 
-    index = faiss.IndexFlatL2(matrix.shape[1])
-    index.add(matrix)
+    shard_dir = os.path.join(index_dir, "shards")
+    os.makedirs(shard_dir, exist_ok=True)
+    shard_size = -(-len(texts) // num_workers)
+    shards = [(texts[start:start + shard_size], os.path.join(shard_dir, f"{output_prefix}.{i}.npy"), batch_size)
+              for i, start in enumerate(range(0, len(texts), shard_size))]
+    threads_per_worker = max(1, (os.cpu_count() or 1) // len(shards))
+    with ProcessPoolExecutor(max_workers=len(shards), initializer=_init_worker,
+                             initargs=(threads_per_worker,)) as pool:
+        shard_paths = list(pool.map(_embed_shard, *zip(*shards)))
 
-    # Save index + metadata
-    index_path = os.path.join(INDEX_DIR, f"{output_prefix}.index")
-    meta_path = os.path.join(META_DIR, f"{output_prefix}.json")
-    faiss.write_index(index, index_path)
-    with open(meta_path, "w") as f:
-        json.dump(metadata, f)
-
-    print(f"[OK] Saved index: {index_path}")
-    print(f"[OK] Saved metadata: {meta_path}")
-    return index, metadata
-
-#7. Main sections to process
-sections = [
-    ("transactions", data.get("transactions", []), format_transaction, "transaction_id"),
-    ("offers", data.get("offers", []), format_offer, "offer_id"),
-    ("financial_assets", data.get("financial_assets", []), format_asset, "asset_id"),
-    ("investment_strategies", data.get("investment_strategies", []), format_strategy, "strategy_id")
-]
-
-indexes = {}
-
-for name, items, formatter, id_key in sections:
-    if items:
-        idx, meta = process_and_index(items, formatter, id_key, name)
-        indexes[name] = (idx, meta)
+    parts = []
+    for shard_path in shard_paths:
+        parts.append(np.load(shard_path))
+        os.remove(shard_path)
+    return np.concatenate(parts)
+
+#6. Content-addressed embedding cache: sha256(model name + formatted text) -> vector.
+# Unchanged records are never re-embedded; only new or edited texts hit the model.
+def text_key(text, model=None):
+    model = model or model_name()
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest().encode("ascii")
+
+class EmbeddingCache:
+    def __init__(self, index_dir=INDEX_DIR):
+        # One directory per model, so vectors of different sizes never share a matrix
+        self.index_dir = index_dir
+        cache_dir = os.path.join(index_dir, "embedding_cache", model_name().replace("/", "_"))
+        self.keys_path = os.path.join(cache_dir, "keys.npy")
+        self.vectors_path = os.path.join(cache_dir, "vectors.npy")
+        self.rows = {}
+        self.vectors = None
+        self.used = set()
+        if os.path.exists(self.keys_path) and os.path.exists(self.vectors_path):
+            keys = np.load(self.keys_path)
+            vectors = np.load(self.vectors_path)
+            if len(keys) == len(vectors):
+                self.rows = {key: row for row, key in enumerate(keys.tolist())}
+                self.vectors = vectors
+
+    def embed(self, texts, output_prefix, num_workers=NUM_WORKERS, keys=None):
+        """Vectors for texts in order, embedding only the ones not cached yet."""
+        keys = keys or [text_key(text) for text in texts]
+        self.used.update(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.rows and key not in missing:
+                missing[key] = text
+        if missing:
+            new_vectors = embed_sharded(list(missing.values()), output_prefix, num_workers,
+                                        index_dir=self.index_dir)
+            offset = 0 if self.vectors is None else len(self.vectors)
+            for i, key in enumerate(missing):
+                self.rows[key] = offset + i
+            self.vectors = new_vectors if self.vectors is None else np.concatenate([self.vectors, new_vectors])
+        rows = np.fromiter((self.rows[key] for key in keys), dtype=np.int64, count=len(keys))
+        return self.vectors[rows], len(missing)
+
+    def save(self):
+        """Persist only the entries used by this build, so deleted records are dropped."""
+        if self.vectors is None:
+            return
+        keys = sorted(self.used, key=self.rows.__getitem__)
+        rows = np.fromiter((self.rows[key] for key in keys), dtype=np.int64, count=len(keys))
+        os.makedirs(os.path.dirname(self.keys_path), exist_ok=True)
+        for path, array in ((self.keys_path, np.array(keys, dtype="S64")),
+                            (self.vectors_path, self.vectors[rows])):
+            tmp_path = path[:-len(".npy")] + ".tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+
+#7. Build + Save FAISS index, updating the previous one in place when possible.
+# Index ids are slots in the metadata list; a deleted or edited record's slot
+# is emptied (None) and its new version gets a fresh slot. The state file
+# remembers which text each slot was embedded from.
+def _state_path(output_prefix, index_dir):
+    return os.path.join(index_dir, "metadata", f"{output_prefix}.state.json")
+
+def _load_previous(output_prefix, index_dir, index_type):
+    """(index, slot ids, slot text keys, built size) of the last build if it can be updated, else None."""
+    index_path = os.path.join(index_dir, f"{output_prefix}.index")
+    meta_path = os.path.join(index_dir, "metadata", f"{output_prefix}.json")
+    state_path = _state_path(output_prefix, index_dir)
+    if not all(os.path.exists(p) for p in (index_path, meta_path, state_path)):
+        return None
+    with open(state_path, "r") as f:
+        state = json.load(f)
+    if state.get("index_type") != index_type or state.get("model") != model_name():
+        return None
+    with open(meta_path, "r") as f:
+        slots = json.load(f)
+    keys = state["keys"]
+    # Read from disk rather than vector_store's cache, which searches keep using meanwhile
+    index = vector_store.configure_search(faiss.read_index(index_path))
+    if len(keys) != len(slots) or sum(key is not None for key in keys) != index.ntotal:
+        return None
+    return index, slots, keys, state["built_size"]
+
+def _plan_update(slots, slot_keys, ids, keys):
+    """(slots to remove, rows to add) that turn the slots into the current (id, text) pairs."""
+    free = {}
+    for slot, (record_id, key) in enumerate(zip(slots, slot_keys)):
+        if key is not None:
+            free.setdefault((record_id, key), []).append(slot)
+    add_rows = []
+    for row, pair in enumerate(zip(ids, keys)):
+        if free.get(pair):
+            free[pair].pop()
+        else:
+            add_rows.append(row)
+    remove_slots = [slot for unused in free.values() for slot in unused]
+    return remove_slots, add_rows
+
+def process_and_index(texts, metadata, output_prefix, cache=None, owners=None,
+                      index_dir=INDEX_DIR, index_type=INDEX_TYPE, num_workers=NUM_WORKERS):
+    """Bring the index for one section up to date with the current records.
+
+    Deleted and edited records are removed from the previous index and new
+    ones added, so the index work follows the change, not the corpus. It is
+    rebuilt instead when there is no usable previous index, the index type
+    cannot remove vectors (HNSW), half its slots are empty, or an ANN index
+    has more than doubled since it was trained.
+
+    With owners, records are clustered by user and a per-user partition is saved too.
+    """
+    print(f"\n[*] Processing {output_prefix}...")
+    if owners is not None:
+        order = sorted(range(len(texts)), key=owners.__getitem__)
+        texts = [texts[i] for i in order]
+        metadata = [metadata[i] for i in order]
+        owners = [owners[i] for i in order]
+
+    start = time.perf_counter()
+    keys = [text_key(text).decode("ascii") for text in texts]
+    if cache is None:
+        matrix, embedded = embed_sharded(texts, output_prefix, num_workers, index_dir=index_dir), len(texts)
     else:
-        print(f"[!] No data found for {name}")
+        matrix, embedded = cache.embed(texts, output_prefix, num_workers, [k.encode("ascii") for k in keys])
+    elapsed = time.perf_counter() - start
 
-#8. Search function
-def search(category, query, k=3):
-    print(f"\n[] Search in '{category}' for: \"{query}\"")
-    if category not in indexes:
-        print(" No index found for that category.")
-        return
-    idx, meta = indexes[category]
-    query_vec = np.array([get_embedding(query)], dtype="float32")
-    D, I = idx.search(query_vec, k)
-    for i, index_id in enumerate(I[0]):
-        print(f"{i+1}. ID: {meta[index_id]} | Score: {D[0][i]:.4f}")
-
-# #9. Test searches
-# search("transactions", "electronics in Delhi")
-# search("offers", "cashback on dining")
-# search("financial_assets", "low-risk bonds with high return")
-# search("investment_strategies", "retirement plan for risk averse")
+    previous = _load_previous(output_prefix, index_dir, index_type)
+    changed = True
+    if previous is not None:
+        index, slots, slot_keys, built_size = previous
+        remove_slots, add_rows = _plan_update(slots, slot_keys, metadata, keys)
+        empty_slots = len(slots) + len(add_rows) - len(texts)
+        if ((remove_slots and not vector_store.supports_removal(index))
+                or empty_slots > len(texts)
+                or (index_type != "flat" and len(texts) > 2 * built_size)):
+            previous = None
+    if previous is not None:
+        changed = bool(remove_slots or add_rows)
+        new_slots = list(range(len(slots), len(slots) + len(add_rows)))
+        vector_store.update_index(index, remove_slots, matrix[add_rows], new_slots)
+        for slot in remove_slots:
+            slots[slot] = slot_keys[slot] = None
+        slots.extend(metadata[row] for row in add_rows)
+        slot_keys.extend(keys[row] for row in add_rows)
+        print(f"[OK] Updated index: +{len(add_rows)} -{len(remove_slots)} vectors")
+    else:
+        index = build_index(matrix, index_type, ids=np.arange(len(texts)))
+        slots, slot_keys, built_size = list(metadata), list(keys), len(texts)
+
+    # Save index + metadata
+    os.makedirs(os.path.join(index_dir, "metadata"), exist_ok=True)
+    index_path = os.path.join(index_dir, f"{output_prefix}.index")
+    meta_path = os.path.join(index_dir, "metadata", f"{output_prefix}.json")
+    if changed:
+        faiss.write_index(index, index_path)
+        with open(meta_path, "w") as f:
+            json.dump(slots, f)
+        with open(_state_path(output_prefix, index_dir), "w") as f:
+            json.dump({"index_type": index_type, "model": model_name(), "built_size": built_size,
+                       "keys": slot_keys}, f)
+    if owners is not None and (changed or vector_store.load_user_partitions(output_prefix, index_dir) is None):
+        save_user_partitions(output_prefix, metadata, owners, matrix, index_dir)
+        print(f"[OK] Saved per-user partitions for {len(set(owners))} users")
+
+    print(f"[OK] Saved index: {index_path}" if changed else f"[OK] Index unchanged: {index_path}")
+    print(f"[OK] Saved metadata: {meta_path}" if changed else f"[OK] Metadata unchanged: {meta_path}")
+    print(f"[OK] Embedded {embedded} new/changed of {len(texts)} texts in {elapsed:.1f}s "
+          f"({embedded / max(elapsed, 1e-9):.1f} texts/sec)")
+    return index, slots, elapsed, embedded
+
+#8. Build every section
+def build_indexes(data_path=DATA_PATH, index_dir=INDEX_DIR, index_type=INDEX_TYPE,
+                  num_workers=NUM_WORKERS):
+    """Update all section indexes from the dataset; {section: (texts, embedded, seconds)}."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Index type must be one of {INDEX_TYPES}, got {index_type!r}")
+    cache = EmbeddingCache(index_dir)
+    throughput = {}
+    for name, (texts, ids, owners) in load_section_texts(data_path).items():
+        if texts:
+            _, _, elapsed, embedded = process_and_index(texts, ids, name, cache, owners,
+                                                        index_dir, index_type, num_workers)
+            throughput[name] = (len(texts), embedded, elapsed)
+        else:
+            print(f"[!] No data found for {name}")
+    cache.save()
+    return throughput
+
+#9. Load + search
+def load_index(category, index_dir=INDEX_DIR):
+    """(faiss index, [record ids]) for a built category, or None."""
+    return vector_store.load_index(category, index_dir)
+
+def search(category, query, k=3, user_id=None, index_dir=INDEX_DIR):
+    """[(record id, L2 distance)] for a text query, nearest first; [] when the index is missing."""
+    if not vector_store.available([category], index_dir):
+        return []
+    return vector_store.search(category, get_embedding(query), k, user_id=user_id, index_dir=index_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FinPilot embedding indexes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="embed the dataset and (re)build the FAISS indexes")
+    build.add_argument("--data", default=DATA_PATH)
+    build.add_argument("--index-dir", default=INDEX_DIR)
+    build.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    build.add_argument("--workers", type=int, default=NUM_WORKERS)
+
+    query = subparsers.add_parser("search", help="query a built index")
+    query.add_argument("category", choices=list(SECTIONS))
+    query.add_argument("query")
+    query.add_argument("-k", type=int, default=3)
+    query.add_argument("--user")
+    query.add_argument("--index-dir", default=INDEX_DIR)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        throughput = build_indexes(args.data, args.index_dir, args.index_type, args.workers)
+        print(f"\nThroughput (batch size {EMBED_BATCH_SIZE}, {args.workers} workers):")
+        for name, (count, embedded, elapsed) in throughput.items():
+            print(f"- {name}: {embedded}/{count} texts embedded in {elapsed:.1f}s "
+                  f"= {embedded / max(elapsed, 1e-9):.1f} texts/sec ({count - embedded} from cache)")
+    elif args.command == "search":
+        print(f"[*] Search in '{args.category}' for: \"{args.query}\"")
+        results = search(args.category, args.query, args.k, args.user, args.index_dir)
+        if not results:
+            print("[!] No index found for that category.")
+        for i, (record_id, score) in enumerate(results):
+            print(f"{i+1}. ID: {record_id} | Score: {score:.4f}")
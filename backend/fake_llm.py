@@ -0,0 +1,124 @@
+# backend/fake_llm.py
+#
+# Offline stand-ins for the chat model and the embedder, for profiling and
+# load tests without the Azure service or the HuggingFace model. Replies are
+# deterministic (derived from the prompt), latency is sampled from a
+# configurable distribution with a fixed seed, and streaming emits words at a
+# steady token rate after the sampled time-to-first-token. Enable with:
+#   FINPILOT_LLM_PROVIDER=fake FINPILOT_EMBEDDING_PROVIDER=fake
+#
+# Latency specs (seconds): "fixed:0.8", "uniform:0.3,1.5", "normal:0.8,0.2",
+# "lognormal:0.8,0.5" (median, sigma).
+
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+import numpy as np
+
+DEFAULT_LATENCY = os.getenv("FINPILOT_FAKE_LLM_LATENCY", "lognormal:0.8,0.4")
+DEFAULT_TOKENS_PER_SECOND = float(os.getenv("FINPILOT_FAKE_LLM_TOKENS_PER_SEC", "60"))
+DEFAULT_ERROR_RATE = float(os.getenv("FINPILOT_FAKE_LLM_ERROR_RATE", "0"))
+DEFAULT_SEED = int(os.getenv("FINPILOT_FAKE_LLM_SEED", "0"))
+EMBEDDING_DIM = 384  # same size as all-MiniLM-L6-v2
+
+_SENTENCES = [
+    "📈 Your portfolio leans heavily on a single asset type; spreading new contributions across bonds and index funds would lower concentration risk.",
+    "💡 Spending in your top category is well above the rest; a monthly cap there would free up cash for your investment goals.",
+    "🛡️ Keep three to six months of expenses in liquid assets before adding higher-risk positions.",
+    "🌍 Most holdings are domestic; a small international allocation would diversify currency and market risk.",
+    "⏳ Returns have been volatile year to year, so a longer holding period suits this mix better than a short-term one.",
+    "💰 Consider tax-saving instruments such as ELSS or PPF to improve after-tax returns.",
+    "🔁 Rebalancing once a year keeps the allocation close to the target without frequent trading costs."
+]
+
+class FakeLLMError(RuntimeError):
+    pass
+
+def parse_latency(spec):
+    """Sampler (rng -> seconds) for a "kind:params" latency spec."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency spec {spec!r}")
+
+def _prompt_text(messages):
+    return "\n".join(m["content"] if isinstance(m, dict) else str(getattr(m, "content", m)) for m in messages)
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+class FakeMessage:
+    """The parts of a LangChain AIMessage / AIMessageChunk the app reads."""
+
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+class FakeChatModel:
+    def __init__(self, latency=DEFAULT_LATENCY, tokens_per_second=DEFAULT_TOKENS_PER_SECOND,
+                 error_rate=DEFAULT_ERROR_RATE, seed=DEFAULT_SEED):
+        self.sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _draw(self):
+        # Shared seeded generator: the same sequence of calls sees the same latencies
+        with self._rng_lock:
+            return self.sample_latency(self._rng), self._rng.random() < self.error_rate
+
+    def reply(self, messages):
+        """Deterministic answer: two or three canned sentences picked by the prompt's hash."""
+        digest = hashlib.sha256(_prompt_text(messages).encode("utf-8")).digest()
+        count = 2 + digest[0] % 2
+        picks = [_SENTENCES[b % len(_SENTENCES)] for b in digest[1:1 + count]]
+        return "\n".join(dict.fromkeys(picks))
+
+    def invoke(self, messages):
+        latency, fail = self._draw()
+        time.sleep(latency)
+        if fail:
+            raise FakeLLMError("injected failure")
+        content = self.reply(messages)
+        return FakeMessage(content, {"input_tokens": _estimate_tokens(_prompt_text(messages)),
+                                     "output_tokens": _estimate_tokens(content)})
+
+    def stream(self, messages):
+        """Words after the sampled time-to-first-token, then one every 1/tokens_per_second."""
+        latency, fail = self._draw()
+        time.sleep(latency)
+        if fail:
+            raise FakeLLMError("injected failure")
+        content = self.reply(messages)
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(1.0 / self.tokens_per_second)
+            yield FakeMessage(word if i == len(words) - 1 else word + " ")
+        yield FakeMessage("", {"input_tokens": _estimate_tokens(_prompt_text(messages)),
+                               "output_tokens": _estimate_tokens(content)})
+
+class FakeEmbeddings:
+    """Deterministic unit vectors seeded by the text's hash, shaped like MiniLM's."""
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).astype("float32").tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
@@ -0,0 +1,108 @@
+# backend/json_stream.py
+#
+# Incremental reader for the dataset file. Instead of json.load-ing the whole
+# document, it walks the top-level object and decodes the elements of each
+# array one at a time from a small sliding buffer, so memory stays bounded by
+# the chunk size plus one record (plus whatever the caller keeps).
+
+import json
+
+CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+
+class _Reader:
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has been consumed so the buffer never holds more than ~one record
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or "" at end of file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number (or literal) that ends exactly at the buffer end may be cut short
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def iter_records(path, sections=None, chunk_size=CHUNK_SIZE):
+    """Yield (section, record) for every element of the top-level arrays in path.
+
+    When sections is given, other sections are still scanned (JSON has no
+    offsets to skip by) but their records are not yielded.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _Reader(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            section = reader.value()
+            reader.expect(":")
+            if reader.peek() == "[":
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.expect("]")
+                else:
+                    while True:
+                        record = reader.value()
+                        if sections is None or section in sections:
+                            yield section, record
+                        if reader.peek() == ",":
+                            reader.expect(",")
+                        else:
+                            reader.expect("]")
+                            break
+            else:
+                reader.value()  # scalar or object metadata such as "_generation"
+            if reader.peek() == ",":
+                reader.expect(",")
+            else:
+                reader.expect("}")
+                return
+
+def load_filtered(path, user_id, user_sections, chunk_size=CHUNK_SIZE):
+    """Build {section: [records]} keeping only user_id's rows in user_sections.
+
+    Peak memory is proportional to the matching slice, not the file.
+    """
+    data = {}
+    for section, record in iter_records(path, chunk_size=chunk_size):
+        rows = data.setdefault(section, [])
+        if user_id is None or section not in user_sections or record.get("user_id") == user_id:
+            rows.append(record)
+    return data
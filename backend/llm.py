@@ -0,0 +1,69 @@
+# backend/llm.py
+#
+# Process-wide LLM and embedding model, created on first use. Nothing heavy
+# is imported or constructed at import time, so pages that never talk to a
+# model (the login screen) render without loading one. Both singletons are
+# shared by every Streamlit session in the process.
+#
+# FINPILOT_LLM_PROVIDER picks the chat model: "azure" (default) or "fake",
+# the offline stand-in from backend/fake_llm.py; FINPILOT_EMBEDDING_PROVIDER
+# does the same for the embedder (see backend/embeddings.py).
+
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Azure OpenAI Configuration
+OPENAI_DEPLOYMENT_ENDPOINT = "https://bfslabopenai.openai.azure.com/"
+DEPLOYMENT_NAME = "gpt-4o-mini"
+API_VERSION = "2023-05-15"
+TEMPERATURE = 0.7
+
+_llm = None
+_llm_lock = threading.Lock()
+
+def provider():
+    return os.getenv("FINPILOT_LLM_PROVIDER", "azure")
+
+def get_llm():
+    """The shared chat model; raises ValueError if the API key is not configured."""
+    global _llm
+    with _llm_lock:
+        if _llm is None and provider() == "fake":
+            from .fake_llm import FakeChatModel
+            _llm = FakeChatModel()
+        elif _llm is None:
+            if provider() != "azure":
+                raise ValueError(f"Unknown FINPILOT_LLM_PROVIDER {provider()!r}, expected 'azure' or 'fake'")
+            api_key = os.getenv("AZURE_OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("AZURE_OPENAI_API_KEY environment variable is not set")
+            from langchain_openai import AzureChatOpenAI
+            _llm = AzureChatOpenAI(
+                openai_api_version=API_VERSION,
+                azure_deployment=DEPLOYMENT_NAME,
+                azure_endpoint=OPENAI_DEPLOYMENT_ENDPOINT,
+                api_key=api_key,
+                temperature=TEMPERATURE
+            )
+        return _llm
+
+def get_embedder():
+    """The shared sentence-embedding model (the same instance the index builder uses)."""
+    from .embeddings import get_model
+    return get_model()
+
+def is_loaded():
+    """{"llm": bool, "embedder": bool}: which models this process has created so far."""
+    from . import embeddings
+    return {"llm": _llm is not None, "embedder": embeddings._model is not None}
+
+class _LazyLLM:
+    """Drop-in for the LLM object: `llm.invoke(...)` creates the client on first use."""
+
+    def __getattr__(self, name):
+        return getattr(get_llm(), name)
+
+llm = _LazyLLM()
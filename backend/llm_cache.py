@@ -0,0 +1,132 @@
+# backend/llm_cache.py
+#
+# Persistent cache of LLM responses, so re-rendering a page whose prompts and
+# data have not changed costs no round-trips. Entries are keyed by a hash of
+# the messages plus the provider, deployment and temperature, expire after a TTL, and
+# the least recently used ones are evicted once the cache grows past
+# MAX_BYTES. Entries tied to a user also carry that user's data version
+# (aggregates.data_version): the first write for a new version drops the
+# user's older entries.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from . import llm as llm_module
+from . import llm_metrics
+
+CACHE_PATH = os.getenv("FINPILOT_LLM_CACHE_PATH", "data/llm_cache.db")
+TTL_SECONDS = int(os.getenv("FINPILOT_LLM_CACHE_TTL", str(24 * 3600)))
+MAX_BYTES = int(os.getenv("FINPILOT_LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    with _schema_lock:
+        if path not in _schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                user_id TEXT,
+                data_version TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_user ON responses (user_id, data_version)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_used ON responses (last_used)")
+            conn.commit()
+            _schema_ready.add(path)
+    return conn
+
+def cache_key(messages, data_version=None):
+    payload = {
+        "messages": messages,
+        "provider": llm_module.provider(),
+        "deployment": llm_module.DEPLOYMENT_NAME,
+        "temperature": llm_module.TEMPERATURE,
+        "data_version": data_version
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+def get(key, path=CACHE_PATH):
+    """Cached response text, or None when missing or expired."""
+    if not os.path.exists(path):
+        return None
+    conn = _connect(path)
+    try:
+        now = time.time()
+        row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > TTL_SECONDS:
+            return None
+        conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return row[0]
+    finally:
+        conn.close()
+
+def put(key, response, user_id=None, data_version=None, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = _connect(path)
+    try:
+        now = time.time()
+        with conn:
+            if user_id is not None:
+                # The user's data changed: answers computed from the old data are stale
+                conn.execute("DELETE FROM responses WHERE user_id = ? AND data_version IS NOT ?",
+                             (user_id, data_version))
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - TTL_SECONDS,))
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, user_id, data_version, response, len(response.encode("utf-8")), now, now))
+            _evict(conn)
+    finally:
+        conn.close()
+
+def _evict(conn):
+    """Drop least recently used entries until the cache fits in MAX_BYTES."""
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= MAX_BYTES:
+        return
+    for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total -= size
+        if total <= MAX_BYTES:
+            break
+
+def invalidate_user(user_id, path=CACHE_PATH):
+    if not os.path.exists(path):
+        return
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM responses WHERE user_id = ?", (user_id,))
+    finally:
+        conn.close()
+
+def cached_invoke(messages, user_id=None, data_version=None, path=CACHE_PATH, site="uncategorized"):
+    """Response text for messages: from the cache when possible, else one llm.invoke.
+
+    Errors from the LLM propagate and are never cached. Both outcomes are
+    recorded in llm_metrics under site.
+    """
+    start = time.perf_counter()
+    key = cache_key(messages, data_version)
+    cached = get(key, path)
+    with _stats_lock:
+        _stats["hits" if cached is not None else "misses"] += 1
+    if cached is not None:
+        llm_metrics.record(site, time.perf_counter() - start, cache_hit=True)
+        return cached
+    response = llm_metrics.for_site(site).invoke(messages).content
+    put(key, response, user_id, data_version, path)
+    return response
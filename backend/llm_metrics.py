@@ -0,0 +1,208 @@
+# backend/llm_metrics.py
+#
+# Per-call-site instrumentation for the shared LLM: wall time, prompt and
+# completion tokens, errors and response-cache hits. Call sites go through
+# for_site("chat").invoke(...) instead of llm.invoke(...). Every call is kept
+# in an in-process aggregate (shown on the Admin page) and appended to a JSONL
+# log that can be summarized later from any process:
+#   python -m backend.llm_metrics --format prometheus
+# Once the log reaches LOG_MAX_BYTES it is rotated to <log>.1 (replacing the
+# previous one), so it never takes more than twice that on disk.
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from .llm import llm
+from .prompt_context import estimate_tokens
+
+LOG_PATH = os.getenv("FINPILOT_LLM_METRICS_LOG", "data/llm_calls.jsonl")  # "" disables the log
+LOG_MAX_BYTES = int(os.getenv("FINPILOT_LLM_METRICS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LATENCY_WINDOW = 1000  # most recent round-trips per site used for the percentiles
+QUANTILES = (0.5, 0.95, 0.99)
+
+class _SiteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, record):
+        self.calls += 1
+        if record.get("cache_hit"):
+            self.cache_hits += 1
+            return
+        self.errors += 1 if record.get("error") else 0
+        self.prompt_tokens += record.get("prompt_tokens") or 0
+        self.completion_tokens += record.get("completion_tokens") or 0
+        self.seconds += record["seconds"]
+        self.latencies.append(record["seconds"])
+
+    def quantile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class Registry:
+    def __init__(self):
+        self.sites = {}
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.sites.setdefault(record["site"], _SiteStats()).add(record)
+
+    def snapshot(self):
+        """[{site, calls, errors, cache_hits, p50_s, p95_s, p99_s, mean_s, tokens}] slowest p95 first."""
+        with self.lock:
+            rows = []
+            for site, s in self.sites.items():
+                round_trips = s.calls - s.cache_hits
+                rows.append({
+                    "site": site,
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "cache_hits": s.cache_hits,
+                    "p50_s": round(s.quantile(0.5), 3),
+                    "p95_s": round(s.quantile(0.95), 3),
+                    "p99_s": round(s.quantile(0.99), 3),
+                    "mean_s": round(s.seconds / round_trips, 3) if round_trips else 0.0,
+                    "prompt_tokens": s.prompt_tokens,
+                    "completion_tokens": s.completion_tokens
+                })
+        return sorted(rows, key=lambda r: r["p95_s"], reverse=True)
+
+    def prometheus_text(self):
+        counters = [
+            ("finpilot_llm_calls_total", "LLM requests by call site, cache hits included.", "calls"),
+            ("finpilot_llm_errors_total", "LLM requests that raised.", "errors"),
+            ("finpilot_llm_cache_hits_total", "Requests answered from the response cache.", "cache_hits"),
+            ("finpilot_llm_prompt_tokens_total", "Prompt tokens sent.", "prompt_tokens"),
+            ("finpilot_llm_completion_tokens_total", "Completion tokens received.", "completion_tokens")
+        ]
+        lines = []
+        with self.lock:
+            sites = sorted(self.sites.items())
+            for name, help_text, attr in counters:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f'{name}{{site="{site}"}} {getattr(s, attr)}' for site, s in sites]
+            name = "finpilot_llm_latency_seconds"
+            lines += [f"# HELP {name} Wall time of LLM round-trips.", f"# TYPE {name} summary"]
+            for site, s in sites:
+                lines += [f'{name}{{site="{site}",quantile="{q}"}} {s.quantile(q):.6f}' for q in QUANTILES]
+                lines.append(f'{name}_sum{{site="{site}"}} {s.seconds:.6f}')
+                lines.append(f'{name}_count{{site="{site}"}} {s.calls - s.cache_hits}')
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+_log_lock = threading.Lock()
+
+def rotated_path(path):
+    return path + ".1"
+
+def record(site, seconds, prompt_tokens=None, completion_tokens=None, error=None, cache_hit=False):
+    entry = {
+        "ts": time.time(),
+        "site": site,
+        "seconds": round(seconds, 6),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "error": error,
+        "cache_hit": cache_hit
+    }
+    registry.add(entry)
+    if LOG_PATH:
+        line = json.dumps(entry) + "\n"
+        with _log_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(LOG_PATH)), exist_ok=True)
+            with open(LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+                full = f.tell() >= LOG_MAX_BYTES
+            if full:
+                os.replace(LOG_PATH, rotated_path(LOG_PATH))
+
+def _text(messages):
+    return "".join(m["content"] if isinstance(m, dict) else str(getattr(m, "content", m)) for m in messages)
+
+def _usage(message):
+    """(prompt, completion) tokens reported by the provider, or (None, None)."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens"), usage.get("output_tokens")
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return token_usage.get("prompt_tokens"), token_usage.get("completion_tokens")
+
+class InstrumentedLLM:
+    """The shared llm, with each invoke/stream recorded under a call-site label."""
+
+    def __init__(self, site):
+        self.site = site
+
+    def invoke(self, messages):
+        start = time.perf_counter()
+        try:
+            response = llm.invoke(messages)
+        except Exception as e:
+            record(self.site, time.perf_counter() - start, error=type(e).__name__)
+            raise
+        prompt_tokens, completion_tokens = _usage(response)
+        record(self.site, time.perf_counter() - start,
+               prompt_tokens or estimate_tokens(_text(messages)),
+               completion_tokens or estimate_tokens(response.content))
+        return response
+
+    def stream(self, messages):
+        start = time.perf_counter()
+        text = []
+        usage = (None, None)
+        try:
+            for chunk in llm.stream(messages):
+                text.append(chunk.content or "")
+                usage = _usage(chunk) if getattr(chunk, "usage_metadata", None) else usage
+                yield chunk
+        except Exception as e:
+            record(self.site, time.perf_counter() - start, error=type(e).__name__)
+            raise
+        record(self.site, time.perf_counter() - start,
+               usage[0] or estimate_tokens(_text(messages)),
+               usage[1] or estimate_tokens("".join(text)))
+
+def for_site(site):
+    return InstrumentedLLM(site)
+
+def load_jsonl(path=LOG_PATH):
+    """Aggregate a JSONL call log (e.g. from another process) into a new Registry.
+
+    The rotated file is read first, so the percentiles cover up to two logs' worth of calls.
+    """
+    loaded = Registry()
+    for log_path in (rotated_path(path), path):
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    loaded.add(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    continue  # torn last line while a writer is appending
+    return loaded
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the LLM call log")
+    parser.add_argument("--log", default=LOG_PATH)
+    parser.add_argument("--format", choices=["prometheus", "jsonl"], default="jsonl")
+    args = parser.parse_args()
+
+    summary = load_jsonl(args.log)
+    if args.format == "prometheus":
+        print(summary.prometheus_text(), end="")
+    else:
+        for row in summary.snapshot():
+            print(json.dumps(row))
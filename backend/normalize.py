@@ -0,0 +1,118 @@
+# backend/normalize.py
+#
+# Ingest-time normalization of the numeric values that assets carry as
+# display strings. Next to each string field the record gets a typed copy,
+# so readers never parse strings on the hot path:
+#   tenure "7 years"                       -> tenure_years 7.0
+#   historical_performance {"2021": "12.3%"} -> historical_returns {"2021": 12.3}
+#   tax_implications {"long_term": "10% after 1 year"}
+#                                          -> tax_rates {"long_term": 10.0, "long_term_after_years": 1.0}
+# historical_returns feeds the analytics history frames; tenure_years and
+# tax_rates feed the per-type asset stats in the analytics prompts
+# (backend/prompt_context.py). The display strings are kept unchanged.
+# Every write path (saves, the SQL import, the data generator) normalizes,
+# and saves diff against normalized copies of the stored records, so records
+# that predate this are only rewritten when they really change. Existing data
+# is backfilled with:
+#   python -m backend.normalize backfill
+
+import argparse
+import json
+import os
+import re
+
+DATA_PATH = "data/large_financial_data.json"
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_AFTER_YEARS = re.compile(r"after\s+(\d+(?:\.\d+)?)\s*year", re.IGNORECASE)
+_MONTHS = re.compile(r"month", re.IGNORECASE)
+
+def parse_percent(value):
+    """12.3 for "12.3%" or 12.3; None when there is no number."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = _NUMBER.search(str(value)) if value is not None else None
+    return float(match.group()) if match else None
+
+def parse_tenure_years(value):
+    """Tenure in years: "7 years" -> 7.0, "18 months" -> 1.5; None when there is no number."""
+    years = parse_percent(value)
+    if years is not None and isinstance(value, str) and _MONTHS.search(value):
+        years /= 12
+    return years
+
+def parse_tax_rates(tax_implications):
+    rates = {}
+    for key, value in (tax_implications or {}).items():
+        rates[key] = parse_percent(value)
+        after = _AFTER_YEARS.search(value) if isinstance(value, str) else None
+        if after:
+            rates[f"{key}_after_years"] = float(after.group(1))
+    return rates
+
+def normalize_asset(asset):
+    """Copy of the asset with its typed fields (re)computed; the input is not modified."""
+    normalized = dict(asset)
+    if "tenure" in asset:
+        normalized["tenure_years"] = parse_tenure_years(asset["tenure"])
+    details = asset.get("financial_details")
+    if isinstance(details, dict):
+        details = dict(details)
+        if "historical_performance" in details:
+            returns = {str(year): parse_percent(value)
+                       for year, value in (details["historical_performance"] or {}).items()}
+            details["historical_returns"] = {year: r for year, r in returns.items() if r is not None}
+        if "tax_implications" in details:
+            details["tax_rates"] = parse_tax_rates(details["tax_implications"])
+        normalized["financial_details"] = details
+    return normalized
+
+def normalize_assets(assets):
+    return [normalize_asset(a) for a in assets]
+
+def normalize_data(data):
+    """Copy of a dataset dict with its financial_assets normalized."""
+    if "financial_assets" not in data:
+        return data
+    return dict(data, financial_assets=normalize_assets(data["financial_assets"]))
+
+# ─── Backfill ───
+def backfill_json(data_path=DATA_PATH):
+    """Normalize every asset in the JSON snapshot; returns the number of records that changed.
+
+    Pending saves are folded in first. The snapshot keeps its generation, so a
+    save logged while the backfill runs still applies on top of it.
+    """
+    # Imported here so the parsers above stay importable by the standalone data generator
+    from . import change_log, columnar_store
+    from .atomic_io import atomic_write_json, file_lock
+    change_log.compact(data_path)
+    log_path = change_log.log_path_for(data_path)
+    with file_lock(log_path):
+        if not os.path.exists(data_path):
+            return 0
+        with open(data_path, "r") as f:
+            data = json.load(f)
+        assets = data.get("financial_assets", [])
+        normalized = normalize_assets(assets)
+        changed = sum(1 for old, new in zip(assets, normalized) if old != new)
+        if changed:
+            data["financial_assets"] = normalized
+            atomic_write_json(data_path, data, indent=2)
+    if changed and columnar_store.load_manifest(columnar_store.store_dir_for(data_path)) is not None:
+        columnar_store.convert_json_to_columnar(data_path, columnar_store.store_dir_for(data_path))
+    return changed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize numeric asset fields")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill = subparsers.add_parser("backfill", help="add the typed fields to existing assets")
+    backfill.add_argument("--data", default=DATA_PATH)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        from . import sql_store
+        if sql_store.is_enabled():
+            print(f"[OK] Normalized {sql_store.backfill_assets()} assets in {sql_store.DATABASE_URL}")
+        else:
+            print(f"[OK] Normalized {backfill_json(args.data)} assets in {args.data}")
@@ -0,0 +1,173 @@
+# backend/prompt_context.py
+#
+# Compact, token-budgeted context for the analytics LLM prompts. Instead of
+# serializing every raw transaction and asset, each prompt gets statistics
+# (per-category totals, amount percentiles, top merchants, per-type return
+# stats, ...) whose size does not grow with the user's history. Spending stats
+# come from the user's materialized aggregates (backend/aggregates.py) when
+# the caller has them. Ranked lists are trimmed until the serialized context
+# fits PROMPT_TOKEN_BUDGET.
+
+import json
+import math
+import os
+from collections import Counter, defaultdict
+from . import aggregates
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("FINPILOT_PROMPT_TOKEN_BUDGET", "1200"))
+CHARS_PER_TOKEN = 4  # rough average for English text and JSON with the GPT tokenizers
+TOP_N = 10
+TAX_TERMS = ("short_term", "long_term")  # rates from normalize.parse_tax_rates worth a prompt's tokens
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def to_json(context):
+    return json.dumps(context, separators=(",", ":"), default=str)
+
+def _round(value, digits=2):
+    return round(float(value), digits)
+
+def _return_stats(returns):
+    return {
+        "count": len(returns),
+        "avg_return": _round(sum(returns) / len(returns)),
+        "min_return": _round(min(returns)),
+        "max_return": _round(max(returns))
+    }
+
+def fit_to_budget(context, budget=PROMPT_TOKEN_BUDGET):
+    """Halve the longest ranked list in context until its JSON fits the token budget.
+
+    Lists are expected best-first, so trimming keeps the most important entries.
+    """
+    while estimate_tokens(to_json(context)) > budget:
+        longest = None
+        for key, value in context.items():
+            if isinstance(value, list) and len(value) > 1 and (longest is None or len(value) > len(context[longest])):
+                longest = key
+        if longest is None:
+            break
+        context[longest] = context[longest][:len(context[longest]) // 2]
+    return context
+
+# ─── Summaries ───
+def summarize_transactions(transactions, aggs=None):
+    """Spending summary; from the user's materialized aggregates when given, else from transactions."""
+    if aggs is None:
+        aggs = aggregates.build({"transactions": transactions})
+    total = aggs["total_spend"]
+    categories = sorted(aggs["categories"].items(), key=lambda kv: kv[1][1], reverse=True)
+    merchants = sorted(aggs["merchants"].items(), key=lambda kv: kv[1][1], reverse=True)
+    currencies = sorted(aggs["currencies"].items(), key=lambda kv: kv[1][1], reverse=True)
+    payment_methods = sorted(aggs["payment_methods"].items(), key=lambda kv: kv[1], reverse=True)
+    return {
+        "total_transactions": aggs["transactions"],
+        "total_spend": _round(total),
+        "spend_by_currency": {c: _round(s[1]) for c, s in currencies},
+        "amount_percentiles": {p: _round(v) for p, v in aggregates.amount_percentiles(aggs).items()},
+        "categories": [
+            {"category": "unknown" if name is None else name, "count": s[0], "total": _round(s[1]),
+             "share_pct": _round(100 * s[1] / total, 1) if total else 0.0}
+            for name, s in categories
+        ],
+        "top_merchants": [
+            {"merchant": name, "count": s[0], "total": _round(s[1])}
+            for name, s in merchants[:TOP_N]
+        ],
+        "payment_methods": dict(payment_methods),
+        "monthly_spend": [{"month": m, "total": _round(s[1])} for m, s in sorted(aggs["months"].items(), reverse=True)]
+    }
+
+def _mean(values, digits=2):
+    return _round(sum(values) / len(values), digits) if values else None
+
+def summarize_assets(assets):
+    returns_by_type = defaultdict(list)
+    risk_by_type = defaultdict(list)
+    # From the typed fields added at ingest (backend/normalize.py)
+    tenure_by_type = defaultdict(list)
+    tax_by_type = defaultdict(lambda: defaultdict(list))
+    countries = Counter()
+    risk_ratings = Counter()
+    for a in assets:
+        asset_type = a.get("type", "unknown")
+        returns_by_type[asset_type].append(float(a.get("expected_return", 0) or 0))
+        risk_by_type[asset_type].append(float(a.get("risk_rating", 0) or 0))
+        if a.get("tenure_years") is not None:
+            tenure_by_type[asset_type].append(a["tenure_years"])
+        for term, rate in ((a.get("financial_details") or {}).get("tax_rates") or {}).items():
+            if term in TAX_TERMS and rate is not None:
+                tax_by_type[asset_type][term].append(rate)
+        countries[a.get("country", "Unknown")] += 1
+        risk_ratings[str(a.get("risk_rating", "unknown"))] += 1
+
+    types = []
+    for asset_type, returns in sorted(returns_by_type.items(), key=lambda kv: len(kv[1]), reverse=True):
+        stats = _return_stats(returns)
+        stats["type"] = asset_type
+        stats["avg_risk"] = _round(sum(risk_by_type[asset_type]) / len(risk_by_type[asset_type]), 1)
+        if tenure_by_type[asset_type]:
+            stats["avg_tenure_years"] = _mean(tenure_by_type[asset_type], 1)
+        if tax_by_type[asset_type]:
+            stats["avg_tax_pct"] = {term: _mean(rates, 1) for term, rates in tax_by_type[asset_type].items()}
+        types.append(stats)
+    top = sorted(assets, key=lambda a: float(a.get("expected_return", 0) or 0), reverse=True)
+    return {
+        "total_assets": len(assets),
+        "by_type": types,
+        "risk_rating_counts": dict(sorted(risk_ratings.items())),
+        "country_counts": dict(countries.most_common()),
+        "top_assets_by_return": [
+            {"name": a.get("name"), "type": a.get("type"), "expected_return": a.get("expected_return"),
+             "risk": a.get("risk_rating"), "tenure_years": a.get("tenure_years", a.get("tenure"))}
+            for a in top[:TOP_N]
+        ]
+    }
+
+# ─── Per-prompt contexts ───
+def asset_context(data, df_assets=None, budget=PROMPT_TOKEN_BUDGET):
+    context = summarize_assets(data.get("financial_assets", []))
+    if df_assets is not None and not df_assets.empty:
+        context["asset_distribution"] = df_assets.round(2).to_dict("records")
+    return fit_to_budget(context, budget)
+
+def spending_context(data, bar_data=None, budget=PROMPT_TOKEN_BUDGET, aggs=None):
+    context = summarize_transactions(data.get("transactions", []), aggs)
+    if bar_data:
+        context["spending_categories"] = dict(Counter(bar_data).most_common())
+    return fit_to_budget(context, budget)
+
+def historical_context(data, hist_df, view_type, budget=PROMPT_TOKEN_BUDGET):
+    by_asset = []
+    for asset, group in hist_df.groupby("Asset"):
+        returns = group.sort_values("Year")["Return"].tolist()
+        stats = _return_stats(returns)
+        stats["asset"] = asset
+        stats["latest_return"] = _round(returns[-1])
+        by_asset.append(stats)
+    by_asset.sort(key=lambda s: s["avg_return"], reverse=True)
+    context = {
+        "view_type": view_type,
+        "years": [int(y) for y in sorted(hist_df["Year"].unique())],
+        "avg_returns_by_year": {int(y): _round(v) for y, v in hist_df.groupby("Year")["Return"].mean().items()},
+        "total_assets": len(data.get("financial_assets", [])),
+        "assets_ranked_by_avg_return": by_asset
+    }
+    return fit_to_budget(context, budget)
+
+def country_context(data, country_df, budget=PROMPT_TOKEN_BUDGET):
+    assets = data.get("financial_assets", [])
+    total = len(assets)
+    rows = country_df.sort_values("Count", ascending=False).to_dict("records")
+    context = {
+        "total_assets": total,
+        "countries": [
+            {"country": r["Country"], "count": int(r["Count"]),
+             "share_pct": _round(100 * r["Count"] / total, 1) if total else 0.0,
+             "avg_return": _round(r["Avg Return"]), "total_value": _round(r["Total Value"])}
+            for r in rows
+        ],
+        "by_type": summarize_assets(assets)["by_type"]
+    }
+    return fit_to_budget(context, budget)
@@ -0,0 +1,146 @@
+# backend/search_index.py
+#
+# BM25 keyword retrieval over the records of one category. Each index keeps
+# an inverted list of term -> {doc: term frequency} and is updated in place
+# when the underlying records change, so only new or edited records are
+# re-tokenized. Query terms also match vocabulary terms they are a prefix of
+# ("invest" -> "investment"), at a discount, like the old substring search.
+
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+
+K1 = 1.2
+B = 0.75
+KEYWORD_BOOST = 2       # tokens from an item's "keywords" list count double
+PREFIX_WEIGHT = 0.5     # partial (prefix) matches score half of an exact match
+MAX_CACHED_INDEXES = 256
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+def _document_terms(item):
+    """Term frequencies over the same fields the keyword search looked at."""
+    terms = Counter()
+    for key, value in item.items():
+        if key == "keywords" and isinstance(value, list):
+            for keyword in value:
+                if isinstance(keyword, str):
+                    for token in tokenize(keyword):
+                        terms[token] += KEYWORD_BOOST
+        elif isinstance(value, str):
+            terms.update(tokenize(value))
+        elif isinstance(value, dict):
+            for v in value.values():
+                if isinstance(v, str):
+                    terms.update(tokenize(v))
+    return terms
+
+class BM25Index:
+    def __init__(self, key_fn):
+        self.key_fn = key_fn
+        self.docs = {}       # doc key -> (item, term counts, length)
+        self.postings = {}   # term -> {doc key: tf}
+        self.total_length = 0
+        self._vocab = None   # sorted terms, rebuilt lazily for prefix lookups
+
+    def _add(self, key, item):
+        terms = _document_terms(item)
+        length = sum(terms.values())
+        self.docs[key] = (item, terms, length)
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[key] = tf
+
+    def _remove(self, key):
+        _, terms, length = self.docs.pop(key)
+        self.total_length -= length
+        for term in terms:
+            posting = self.postings[term]
+            del posting[key]
+            if not posting:
+                del self.postings[term]
+
+    def update(self, items):
+        """Sync the index with items, touching only records that were added, changed or removed."""
+        current = {}
+        for item in items:
+            current[self.key_fn(item)] = item
+        changed = False
+        for key in [k for k in self.docs if k not in current]:
+            self._remove(key)
+            changed = True
+        for key, item in current.items():
+            doc = self.docs.get(key)
+            if doc is not None and (doc[0] is item or doc[0] == item):
+                continue
+            if doc is not None:
+                self._remove(key)
+            self._add(key, item)
+            changed = True
+        if changed:
+            self._vocab = None
+
+    def _expand(self, token):
+        """[(term, weight)] for a query token: itself plus vocabulary terms it prefixes."""
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        expanded = []
+        i = bisect_left(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token):
+            term = self._vocab[i]
+            expanded.append((term, 1.0 if term == token else PREFIX_WEIGHT))
+            i += 1
+        return expanded
+
+    def search(self, query, k):
+        """Top-k (item, bm25 score) pairs, best first."""
+        n_docs = len(self.docs)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs
+        scores = {}
+        for token in set(tokenize(query)):
+            for term, weight in self._expand(token):
+                posting = self.postings[term]
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for key, tf in posting.items():
+                    length = self.docs[key][2]
+                    norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+                    scores[key] = scores.get(key, 0.0) + weight * idf * norm
+        top = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [(self.docs[key][0], score) for key, score in top]
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_index(name, items, key_fn):
+    """Cached index for a (category, owner) name, brought up to date with items."""
+    with _indexes_lock:
+        entry = _indexes.get(name)
+        if entry is None:
+            entry = (BM25Index(key_fn), threading.Lock(), [None])
+            _indexes[name] = entry
+            if len(_indexes) > MAX_CACHED_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(name)
+    index, lock, last_items = entry
+    with lock:
+        # dataset_cache views are immutable tuples, replaced when the data changes:
+        # the same object means nothing changed. Lists (stream and SQL modes) are
+        # new on every load and always go through update()
+        if last_items[0] is not items:
+            index.update(items)
+            last_items[0] = items
+    return index, lock
+
+def search(name, items, query, k, key_fn):
+    index, lock = get_index(name, items, key_fn)
+    with lock:
+        return index.search(query, k)
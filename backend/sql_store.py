@@ -0,0 +1,247 @@
+# backend/sql_store.py
+#
+# SQLite storage backend (any SQLAlchemy URL works). Enabled with
+# FINPILOT_STORAGE=sqlite; the JSON snapshot + change log stays the default.
+# Records keep their full JSON in a "record" column next to the indexed
+# fields the app filters and sorts on.
+#
+# Import the existing JSON files with:
+#   python -m backend.sql_store migrate
+
+import argparse
+import json
+import os
+import threading
+from sqlalchemy import (Column, Float, Index, MetaData, String, Table, Text, create_engine,
+                        delete, insert, select)
+from sqlalchemy.exc import IntegrityError  # re-exported for callers that don't import SQLAlchemy
+from . import change_log, normalize
+
+DATABASE_URL = os.getenv("FINPILOT_DATABASE_URL", "sqlite:///data/finpilot.db")
+MIGRATION_BATCH_SIZE = 5000
+
+metadata = MetaData()
+
+users_table = Table(
+    "users", metadata,
+    Column("email", String, primary_key=True),
+    Column("password", String, nullable=False)
+)
+
+transactions_table = Table(
+    "transactions", metadata,
+    Column("transaction_id", String, primary_key=True),
+    Column("user_id", String),
+    Column("timestamp", String),
+    Column("category", String),
+    Column("amount", Float),
+    Column("currency", String),
+    Column("record", Text, nullable=False),
+    Index("ix_transactions_user_timestamp", "user_id", "timestamp"),
+    Index("ix_transactions_user_category", "user_id", "category")
+)
+
+financial_assets_table = Table(
+    "financial_assets", metadata,
+    Column("asset_id", String, primary_key=True),
+    Column("user_id", String),
+    Column("type", String),
+    Column("country", String),
+    Column("record", Text, nullable=False),
+    Index("ix_financial_assets_user_type", "user_id", "type")
+)
+
+investment_strategies_table = Table(
+    "investment_strategies", metadata,
+    Column("strategy_id", String, primary_key=True),
+    Column("risk_profile", String),
+    Column("time_horizon", String),
+    Column("record", Text, nullable=False)
+)
+
+offers_table = Table(
+    "offers", metadata,
+    Column("offer_id", String, primary_key=True),
+    Column("record", Text, nullable=False)
+)
+
+TABLES = {
+    "transactions": transactions_table,
+    "financial_assets": financial_assets_table,
+    "investment_strategies": investment_strategies_table,
+    "offers": offers_table
+}
+
+def is_enabled():
+    return os.getenv("FINPILOT_STORAGE", "json").lower() == "sqlite"
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Create the engine and schema once per process."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            if DATABASE_URL.startswith("sqlite:///"):
+                os.makedirs(os.path.dirname(DATABASE_URL[len("sqlite:///"):]) or ".", exist_ok=True)
+            _engine = create_engine(DATABASE_URL)
+            metadata.create_all(_engine)
+        return _engine
+
+def _row(section, record):
+    """Indexed columns for a record plus its full JSON."""
+    table = TABLES[section]
+    row = {"record": json.dumps(record)}
+    for column in table.columns:
+        if column.name != "record":
+            row[column.name] = record.get(column.name)
+    return row
+
+def _records(result):
+    return [json.loads(row.record) for row in result]
+
+# ─── Reads ───
+def load_user_data(user_id):
+    """Every section, with transactions and assets narrowed to user_id by index lookups."""
+    engine = get_engine()
+    with engine.connect() as conn:
+        data = {
+            "transactions": _records(conn.execute(
+                select(transactions_table.c.record)
+                .where(transactions_table.c.user_id == user_id)
+                .order_by(transactions_table.c.timestamp))),
+            "financial_assets": _records(conn.execute(
+                select(financial_assets_table.c.record)
+                .where(financial_assets_table.c.user_id == user_id))),
+            "investment_strategies": _records(conn.execute(
+                select(investment_strategies_table.c.record))),
+            "offers": _records(conn.execute(select(offers_table.c.record)))
+        }
+    return data
+
+def load_users():
+    with get_engine().connect() as conn:
+        return {row.email: row.password for row in conn.execute(select(users_table))}
+
+def get_user_password(email):
+    with get_engine().connect() as conn:
+        return conn.execute(
+            select(users_table.c.password).where(users_table.c.email == email)).scalar()
+
+# ─── Writes ───
+def save_user(email, password):
+    """Insert a new user; raises IntegrityError if the email is already registered."""
+    with get_engine().begin() as conn:
+        conn.execute(insert(users_table), {"email": email, "password": password})
+
+def apply_entries(entries):
+    """Apply change-log style put/delete entries in one transaction.
+
+    In the per-user tables an entry only reaches its own user's rows, like
+    the JSON log: it cannot delete another user's record with the same id,
+    and putting a record owned by someone else raises ValueError.
+    """
+    if not entries:
+        return
+    with get_engine().begin() as conn:
+        for entry in entries:
+            table = TABLES[entry["section"]]
+            match = table.c[change_log.ID_KEYS[entry["section"]]] == entry["id"]
+            if "user_id" in table.c:
+                if entry["op"] == "put" and entry["record"].get("user_id") != entry["user_id"]:
+                    raise ValueError(f"{entry['section']} record {entry['id']} does not belong to {entry['user_id']}")
+                match = match & (table.c.user_id == entry["user_id"])
+            conn.execute(delete(table).where(match))
+            if entry["op"] == "put":
+                conn.execute(insert(table), _row(entry["section"], entry["record"]))
+
+def save_user_records(user_id, data):
+    """Store the user's sections passed in data, writing only the rows that changed.
+
+    Returns the applied entries and the records they were diffed against.
+    """
+    data = normalize.normalize_data(data)
+    current = load_user_data(user_id)
+    # Compared in normalized form, so rows not backfilled yet are not all rewritten
+    base = normalize.normalize_data(current)
+    entries = []
+    for section in ("transactions", "financial_assets"):
+        if section in data:
+            entries.extend(change_log.diff_entries(section, user_id, base[section], data[section]))
+    apply_entries(entries)
+    return entries, current
+
+def delete_transaction(user_id, tx_id):
+    with get_engine().begin() as conn:
+        conn.execute(delete(transactions_table).where(
+            transactions_table.c.transaction_id == tx_id,
+            transactions_table.c.user_id == user_id))
+
+def delete_asset(user_id, asset_id):
+    with get_engine().begin() as conn:
+        conn.execute(delete(financial_assets_table).where(
+            financial_assets_table.c.asset_id == asset_id,
+            financial_assets_table.c.user_id == user_id))
+
+# ─── Migration ───
+def migrate_json(data_path, users_path, batch_size=MIGRATION_BATCH_SIZE):
+    """Bulk-import the JSON dataset and users file, replacing existing rows."""
+    engine = get_engine()
+    with open(data_path, "r") as f:
+        data = json.load(f)
+    # Fold in saves that are still sitting in the change log
+    data_log = change_log.log_path_for(data_path)
+    by_section = {}
+    for entry in change_log.read_entries(data_log):
+        by_section.setdefault(entry["section"], []).append(entry)
+    for section, entries in by_section.items():
+        data[section] = change_log.apply_entries(data.get(section, []), entries, section)
+    data = normalize.normalize_data(data)
+
+    counts = {}
+    with engine.begin() as conn:
+        for section, table in TABLES.items():
+            records = data.get(section, [])
+            conn.execute(delete(table))
+            for start in range(0, len(records), batch_size):
+                batch = records[start:start + batch_size]
+                conn.execute(insert(table), [_row(section, r) for r in batch])
+            counts[section] = len(records)
+
+        if os.path.exists(users_path):
+            with open(users_path, "r") as f:
+                users = json.load(f)
+            conn.execute(delete(users_table))
+            if users:
+                conn.execute(insert(users_table),
+                             [{"email": email, "password": password} for email, password in users.items()])
+            counts["users"] = len(users)
+    return counts
+
+def backfill_assets(batch_size=MIGRATION_BATCH_SIZE):
+    """Add the normalized numeric fields to stored assets; returns the number rewritten."""
+    with get_engine().connect() as conn:
+        assets = _records(conn.execute(select(financial_assets_table.c.record)))
+    entries = []
+    for asset in assets:
+        normalized = normalize.normalize_asset(asset)
+        if normalized != asset:
+            entries.append({"op": "put", "section": "financial_assets", "user_id": asset.get("user_id"),
+                            "id": change_log.record_key(asset, "financial_assets"), "record": normalized})
+    for start in range(0, len(entries), batch_size):
+        apply_entries(entries[start:start + batch_size])
+    return len(entries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FinPilot SQL storage")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="import the JSON dataset and users")
+    migrate.add_argument("--data", default="data/large_financial_data.json")
+    migrate.add_argument("--users", default="backend/users.json")
+    migrate.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        for name, count in migrate_json(args.data, args.users, args.batch_size).items():
+            print(f"- {name}: {count} rows")
@@ -0,0 +1,243 @@
+# backend/vector_store.py
+#
+# Read side of the FAISS indexes written by backend/embeddings.py. Indexes
+# are loaded once per process (and reloaded when the files change) so the
+# chatbot can rank by the query embedding it already computes. build_index
+# is the factory embeddings.py builds them with: exact (flat) or approximate
+# (IVF-Flat, HNSW, IVF-PQ), whose recall/speed trade-off is set at query time
+# by NPROBE / EF_SEARCH. Compare them with:
+#   python -m backend.benchmarks ann --sizes 10000 100000
+#
+# Per-user sections (transactions, financial_assets) also get a partitioned
+# copy of their vectors, clustered by user_id, so a user's search scans only
+# that user's rows instead of filtering a global top-k.
+
+import json
+import math
+import os
+import threading
+import faiss
+import numpy as np
+
+INDEX_DIR = "faiss_multi_output"
+META_DIR = os.path.join(INDEX_DIR, "metadata")
+_PARTITION_FILES = ("vectors", "ids", "users", "starts", "stops")
+
+# Over-fetch factor when results are post-filtered to a subset of ids
+FILTER_OVERFETCH = 10
+
+# Index factory settings
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+MIN_ANN_VECTORS = 10_000       # below this a flat scan is already fast and exact
+TRAIN_SAMPLE_SIZE = 100_000    # vectors sampled to train IVF centroids and PQ codebooks
+HNSW_M = 32
+PQ_BITS = 8
+
+# Query-time knobs: IVF lists probed, HNSW candidate list size
+NPROBE = int(os.getenv("FINPILOT_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("FINPILOT_EF_SEARCH", "64"))
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+# ─── Building ───
+def _nlist(n):
+    # ~4*sqrt(n) inverted lists, keeping the 39 training points per centroid faiss asks for
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+def _pq_subquantizers(d):
+    # Largest code count that splits d evenly into sub-vectors of at least 8 dims
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2):
+        if d % m == 0 and d // m >= 8:
+            return m
+    return 1
+
+def factory_string(index_type, d, n):
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{_nlist(n)},Flat"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if index_type == "ivf_pq":
+        return f"IVF{_nlist(n)},PQ{_pq_subquantizers(d)}x{PQ_BITS}"
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+def configure_search(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    """Apply the query-time recall/speed settings; no-op for flat indexes."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    hnsw = getattr(_unwrap(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
+    return index
+
+def _unwrap(index):
+    # Flat and HNSW indexes with ids are wrapped in an IndexIDMap; IVF ones carry ids natively
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+def build_index(matrix, index_type="flat", train_sample_size=TRAIN_SAMPLE_SIZE, seed=0, ids=None):
+    """Index over the rows of a float32 matrix, trained on a random sample when needed.
+
+    With ids (one int64 per row) searches return those ids instead of row
+    numbers, and the index can be changed in place with update_index.
+    """
+    n, d = matrix.shape
+    factory = factory_string(index_type, d, n)
+    if index_type != "flat" and n < MIN_ANN_VECTORS:
+        print(f"[!] {n} vectors is below {MIN_ANN_VECTORS}, building a flat index instead of {index_type}")
+        factory = "Flat"
+    if ids is not None and not factory.startswith("IVF"):
+        factory = "IDMap," + factory
+    index = faiss.index_factory(d, factory)
+    if hasattr(index, "do_polysemous_training"):
+        # Only needed for polysemous search, which is never used, and it dominates PQ training time
+        index.do_polysemous_training = False
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(n, min(n, train_sample_size), replace=False))]
+        index.train(sample)
+    if ids is None:
+        index.add(matrix)
+    else:
+        index.add_with_ids(matrix, np.asarray(ids, dtype=np.int64))
+    return configure_search(index)
+
+def supports_removal(index):
+    # HNSW graphs cannot drop vectors
+    return getattr(_unwrap(index), "hnsw", None) is None
+
+def update_index(index, remove_ids, matrix, ids):
+    """Remove and add vectors of an index built with ids, in place."""
+    if len(remove_ids):
+        index.remove_ids(np.asarray(remove_ids, dtype=np.int64))
+    if len(ids):
+        index.add_with_ids(np.ascontiguousarray(matrix, dtype="float32"), np.asarray(ids, dtype=np.int64))
+    return index
+
+def _save_npy(path, array):
+    tmp_path = path[:-len(".npy")] + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def save_user_partitions(category, ids, owners, matrix, index_dir=INDEX_DIR):
+    """Store matrix rows (already sorted by owner) with a user -> [start, stop) row index."""
+    user_dir = os.path.join(index_dir, "users")
+    os.makedirs(user_dir, exist_ok=True)
+    users, starts, counts = np.unique(np.array(owners, dtype=str), return_index=True, return_counts=True)
+    arrays = {
+        "vectors": np.ascontiguousarray(matrix, dtype="float32"),
+        "ids": np.array([str(record_id) for record_id in ids], dtype=str),
+        "users": users,
+        "starts": starts.astype(np.int64),
+        "stops": (starts + counts).astype(np.int64)
+    }
+    for name in _PARTITION_FILES:
+        _save_npy(os.path.join(user_dir, f"{category}.{name}.npy"), arrays[name])
+
+# ─── Loading and search ───
+
+def _paths(category, index_dir):
+    return (os.path.join(index_dir, f"{category}.index"),
+            os.path.join(index_dir, "metadata", f"{category}.json"))
+
+def load_index(category, index_dir=INDEX_DIR):
+    """(faiss index, [record ids]) for a category, or None when it has not been built.
+
+    The index returns positions in the id list; slots of deleted records are None.
+    """
+    index_path, meta_path = _paths(category, index_dir)
+    if not (os.path.exists(index_path) and os.path.exists(meta_path)):
+        return None
+    version = (os.path.getmtime(index_path), os.path.getmtime(meta_path))
+    with _cache_lock:
+        cached = _cache.get((index_dir, category))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            index = configure_search(faiss.read_index(index_path))
+            with open(meta_path, "r") as f:
+                ids = json.load(f)
+        except Exception as e:
+            print(f"[!] Could not load FAISS index for {category}: {e}")
+            return None
+        _cache[(index_dir, category)] = (version, (index, ids))
+        return index, ids
+
+def load_user_partitions(category, index_dir=INDEX_DIR):
+    """Memory-mapped {vectors, ids, users, starts, stops} for a category, or None if not built."""
+    paths = [os.path.join(index_dir, "users", f"{category}.{name}.npy") for name in _PARTITION_FILES]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    version = tuple(os.path.getmtime(p) for p in paths)
+    with _cache_lock:
+        cached = _cache.get((index_dir, category, "users"))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            parts = {name: np.load(path, mmap_mode="r") for name, path in zip(_PARTITION_FILES, paths)}
+        except Exception as e:
+            print(f"[!] Could not load user partitions for {category}: {e}")
+            return None
+        if len(parts["vectors"]) != len(parts["ids"]):
+            return None  # caught between two rebuild writes
+        _cache[(index_dir, category, "users")] = (version, parts)
+        return parts
+
+def _search_user(parts, user_id, query_vector, k, allowed_ids):
+    """Exact scan over one user's contiguous rows; cost grows with that user only."""
+    users = parts["users"]
+    i = int(np.searchsorted(users, user_id))
+    if i == len(users) or users[i] != user_id:
+        return []
+    start, stop = int(parts["starts"][i]), int(parts["stops"][i])
+    query = np.asarray(query_vector, dtype="float32")
+    block = parts["vectors"][start:stop]
+    if query.shape != block.shape[1:]:
+        return []
+    distances = ((block - query) ** 2).sum(axis=1)
+    results = []
+    for row in np.argsort(distances, kind="stable"):
+        record_id = str(parts["ids"][start + row])
+        if allowed_ids is not None and record_id not in allowed_ids:
+            continue
+        results.append((record_id, float(distances[row])))
+        if len(results) == k:
+            break
+    return results
+
+def available(categories, index_dir=INDEX_DIR):
+    return any(all(os.path.exists(p) for p in _paths(c, index_dir)) for c in categories)
+
+def search(category, query_vector, k, allowed_ids=None, user_id=None, index_dir=INDEX_DIR):
+    """[(record id, L2 distance)] nearest first; [] if the index is missing or incompatible.
+
+    With user_id, only that user's partition is scanned. With allowed_ids, only
+    those records are returned (over-fetching from the global index when there
+    is no partition to make up for the ones filtered out).
+    """
+    if user_id is not None:
+        parts = load_user_partitions(category, index_dir)
+        if parts is not None:
+            return _search_user(parts, user_id, query_vector, k, allowed_ids)
+    loaded = load_index(category, index_dir)
+    if loaded is None:
+        return []
+    index, ids = loaded
+    query = np.asarray([query_vector], dtype="float32")
+    if index.ntotal == 0 or query.shape[1] != index.d:
+        return []
+    fetch = k if allowed_ids is None else min(index.ntotal, k * FILTER_OVERFETCH)
+    distances, rows = index.search(query, fetch)
+    results = []
+    for distance, row in zip(distances[0], rows[0]):
+        if row < 0 or row >= len(ids) or ids[row] is None:
+            continue
+        record_id = ids[row]
+        if allowed_ids is not None and record_id not in allowed_ids:
+            continue
+        results.append((record_id, float(distance)))
+        if len(results) == k:
+            break
+    return results